@@ -44,7 +44,9 @@ class MCPClientManager {
         }
     }
 
-    async callTool(toolRequest) {
+    // Aborting `signal` sends notifications/cancelled, which stops the Python pipeline.
+    // `timeout` (ms) overrides the SDK's 60s request timeout for long-running tools.
+    async callTool(toolRequest, { signal, timeout } = {}) {
         if (!this.isConnected) {
             await this.initialize();
         }
@@ -54,11 +56,15 @@ class MCPClientManager {
             const result = await this.client.callTool({
                 name: toolRequest.name,
                 arguments: toolRequest.arguments || {}
-            });
+            }, undefined, { signal, timeout });
             console.log('MCP tool result received');
             return result;
         } catch (error) {
-            console.error('Tool call failed:', error);
+            if (signal?.aborted) {
+                console.log('Tool call cancelled:', toolRequest.name);
+            } else {
+                console.error('Tool call failed:', error);
+            }
             throw error;
         }
     }
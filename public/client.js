@@ -26,6 +26,10 @@ document.addEventListener('DOMContentLoaded', () => {
     // Settings State
     let settingsOpen = false;
     let isFollowUp = false;
+    // Aborting the pending request lets the server cancel its pipeline run
+    let pendingSearch = null;
+
+    window.addEventListener('pagehide', () => pendingSearch?.abort());
 
     // Toggle Settings
     settingsToggle.addEventListener('click', () => {
@@ -93,6 +97,8 @@ document.addEventListener('DOMContentLoaded', () => {
     clearButton.addEventListener('click', resetChat);
 
     async function resetChat() {
+        pendingSearch?.abort();
+
         // Clear backend history
         try {
             await fetch('/api/mcp', {
@@ -176,6 +182,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
             };
 
+            pendingSearch = new AbortController();
             const response = await fetch('/api/mcp', {
                 method: 'POST',
                 headers: {
@@ -184,7 +191,8 @@ document.addEventListener('DOMContentLoaded', () => {
                 body: JSON.stringify({
                     name: toolName,
                     arguments: args
-                })
+                }),
+                signal: pendingSearch.signal
             });
 
             const data = await response.json();
@@ -208,7 +216,7 @@ document.addEventListener('DOMContentLoaded', () => {
                     // Render thinking details first
                     renderThinkingDetails(parsed.thinking);
                     // Render answer
-                    await typeMessage('ai', parsed.answer, query, parsed.sources);
+                    await typeMessage('ai', parsed.answer, query, parsed.sources, parsed.cache_id);
                 } else {
                     // Legacy/fallback
                     await typeMessage('ai', rawText, query);
@@ -226,7 +234,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 if (data.thinking) {
                     renderThinkingDetails(data.thinking);
                 }
-                await typeMessage('ai', data.answer, query, data.sources);
+                await typeMessage('ai', data.answer, query, data.sources, data.cache_id);
                 isFollowUp = true;
             } else {
                 await typeMessage('ai', "I'm not sure how to interpret that response.");
@@ -236,8 +244,11 @@ document.addEventListener('DOMContentLoaded', () => {
         } catch (error) {
             clearInterval(stepInterval);
             removeThinkingProcess(thinkingId);
-            await typeMessage('ai', `**Connection Error:** ${error.message}`);
+            if (error.name !== 'AbortError') {
+                await typeMessage('ai', `**Connection Error:** ${error.message}`);
+            }
         } finally {
+            pendingSearch = null;
             queryInput.disabled = false;
             sendButton.disabled = false;
             queryInput.focus();
@@ -245,7 +256,7 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
-    async function typeMessage(role, text, query = null, sources = []) {
+    async function typeMessage(role, text, query = null, sources = [], cacheId = null) {
         const messageDiv = document.createElement('div');
         messageDiv.className = `message ${role}`;
 
@@ -290,13 +301,13 @@ document.addEventListener('DOMContentLoaded', () => {
 
         // Add Feedback UI if query is present (meaning it's a response to a query)
         if (query) {
-            addFeedbackControls(content, query, text);
+            addFeedbackControls(content, query, text, cacheId);
         }
 
         scrollToBottom();
     }
 
-    function addFeedbackControls(container, query, response) {
+    function addFeedbackControls(container, query, response, cacheId = null) {
         const feedbackDiv = document.createElement('div');
         feedbackDiv.className = 'feedback-actions';
 
@@ -338,7 +349,8 @@ document.addEventListener('DOMContentLoaded', () => {
                         arguments: {
                             query: query,
                             response: response,
-                            evaluation: type
+                            evaluation: type,
+                            cache_id: cacheId || ""
                         }
                     })
                 });
@@ -348,7 +360,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
             // Show feedback form if bad
             if (type === 'bad') {
-                showFeedbackForm(container, query, response);
+                showFeedbackForm(container, query, response, cacheId);
             }
         };
 
@@ -356,7 +368,7 @@ document.addEventListener('DOMContentLoaded', () => {
         downBtn.addEventListener('click', () => handleVote('bad'));
     }
 
-    function showFeedbackForm(container, query, response) {
+    function showFeedbackForm(container, query, response, cacheId = null) {
         // Check if form already exists
         if (container.querySelector('.feedback-form')) return;
 
@@ -392,7 +404,8 @@ document.addEventListener('DOMContentLoaded', () => {
                         arguments: {
                             query: query,
                             response: response,
-                            feedback: feedback
+                            feedback: feedback,
+                            cache_id: cacheId || ""
                         }
                     })
                 });
@@ -0,0 +1,294 @@
+"""
+Offline benchmark for the MCP search pipeline.
+
+Drives `search`, `follow_up`, the news path and each domain client with a fixed
+query set while Groq, Event Registry and Mongo are replaced by the local
+stand-ins in stand_ins.py. FAISS indexes, knowledge graphs and the embedding
+model are the real ones from src/assets.
+
+Usage (from anywhere):
+    python scripts/BENCHMARK/benchmark_search.py --concurrency 1,4 --output bench.json
+    python scripts/BENCHMARK/benchmark_search.py --compare bench_before.json --output bench_after.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.append(os.path.join(ROOT, "src"))
+sys.path.append(os.path.dirname(__file__))
+
+from stand_ins import FakeGroqClient, InMemoryCacheDB, InMemoryCacheWriter, canned_articles
+
+DEFAULT_QUERIES = [
+    "What bills has Congress introduced about artificial intelligence safety?",
+    "Which executive orders address federal hiring in 2025?",
+    "How has the Supreme Court ruled on the Fourth Amendment and cell phone searches?",
+    "What is the status of H.R. 1 in the 119th Congress?",
+    "Did the President sign an executive order on tariffs?",
+    "What did the Supreme Court decide about affirmative action in college admissions?",
+    "Are there bills to expand veterans health care benefits?",
+    "Which executive orders changed federal climate policy?",
+    "How does the Court interpret the Second Amendment after Bruen?",
+    "What legislation addresses student loan forgiveness?",
+    "What are the latest news on immigration enforcement orders?",
+    "Has Congress proposed changes to Section 230?",
+]
+
+SCENARIOS = ["search", "follow_up", "news", "bills", "orders", "opinions"]
+
+
+class StageRecorder:
+    """Thread-safe collection of per-stage durations."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(list)
+
+    def record(self, stage, seconds, attributes=None):
+        """Telemetry listener; spans tagged with a domain are kept per domain."""
+        if attributes and "domain" in attributes:
+            stage = f"{stage}:{attributes['domain']}"
+        with self.lock:
+            self.samples[stage].append(seconds)
+
+    def drain(self):
+        with self.lock:
+            samples = dict(self.samples)
+            self.samples = defaultdict(list)
+        return {stage: summarize(values) for stage, values in samples.items()}
+
+
+def summarize(values):
+    if not values:
+        return {"count": 0}
+    arr = np.array(values, dtype=np.float64) * 1000
+    return {
+        "count": len(values),
+        "mean_ms": float(arr.mean()),
+        "p50_ms": float(np.percentile(arr, 50)),
+        "p95_ms": float(np.percentile(arr, 95)),
+        "p99_ms": float(np.percentile(arr, 99)),
+        "max_ms": float(arr.max()),
+    }
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes on Linux
+    if platform.system() == "Darwin":
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return None
+
+
+def load_server(args, recorder):
+    """Import MCPServer with every external service replaced by a local stand-in."""
+    os.chdir(ROOT)
+    os.environ.setdefault("GROQ_API_KEY", "offline-benchmark")
+    os.environ.setdefault("NEWS_API_KEY", "offline-benchmark")
+    # Every scenario reruns the same queries, so cached retrieval would hide the pipeline
+    if not args.use_cache:
+        os.environ.setdefault("RETRIEVAL_CACHE", "0")
+
+    import CacheHit
+    import NewsClient as news_module
+    import Telemetry
+    import MCPServer
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+    Telemetry.add_listener(recorder.record)
+
+    fake = FakeGroqClient(latency=args.llm_latency, jitter=args.llm_jitter)
+    MCPServer.llm_client = fake
+    MCPServer.convo_history.llm_client = fake
+    news_module.GroqClient = lambda *a, **k: fake
+    news_module.NewsClient.search_articles = lambda self, query, count=2, sort_by="rel", lang="eng": canned_articles(query, count)
+
+    CacheHit.connect = lambda *a, **k: None
+    CacheHit.CacheDB = InMemoryCacheDB
+    MCPServer.CacheDB = InMemoryCacheDB
+    MCPServer.cache_hit = CacheHit.cache_hit
+    MCPServer.cache_writer.close()
+    MCPServer.cache_writer = InMemoryCacheWriter()
+
+    return MCPServer
+
+
+def build_calls(server, scenario, queries, embeddings, args):
+    if scenario == "search":
+        return [lambda q=q: server.run_search(q, use_cache=args.use_cache) for q in queries]
+    if scenario == "follow_up":
+        return [lambda q=q: server.run_follow_up(q, 5, 5, 5, use_cache=args.use_cache) for q in queries]
+    if scenario == "news":
+        return [lambda q=q, e=e: server.get_news_articles(q, e) for q, e in zip(queries, embeddings)]
+    if scenario == "bills":
+        return [lambda q=q, e=e: server.bills.search_congressional_bills(q, e, args.k) for q, e in zip(queries, embeddings)]
+    if scenario == "orders":
+        return [lambda q=q, e=e: server.orders.search_executive_orders(q, e, args.k) for q, e in zip(queries, embeddings)]
+    if scenario == "opinions":
+        return [lambda q=q, e=e: server.opinions.search_supreme_court_decisions(q, e, args.k) for q, e in zip(queries, embeddings)]
+    raise ValueError(f"Unknown scenario: {scenario}")
+
+
+def run_calls(calls, concurrency):
+    latencies = []
+    errors = []
+
+    def call(fn):
+        start = time.perf_counter()
+        try:
+            fn()
+        except Exception as e:
+            errors.append(repr(e))
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(call, calls))
+    wall = time.perf_counter() - start
+
+    return {
+        "calls": len(calls),
+        "concurrency": concurrency,
+        "wall_seconds": wall,
+        "throughput_qps": len(calls) / wall if wall > 0 else None,
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "latency": summarize(latencies),
+    }
+
+
+def run(args):
+    recorder = StageRecorder()
+    server = load_server(args, recorder)
+
+    if args.queries:
+        with open(args.queries, "r") as f:
+            queries = json.load(f)
+    else:
+        queries = DEFAULT_QUERIES
+    queries = queries * args.repeat
+
+    embeddings = []
+    for q in queries:
+        qe = np.array(server.model.encode_query(q), dtype=np.float32).reshape(1, -1)
+        embeddings.append(qe / np.linalg.norm(qe))
+
+    if args.warmup:
+        for fn in build_calls(server, "bills", queries[:1], embeddings[:1], args):
+            fn()
+    recorder.drain()
+
+    results = {}
+    for scenario in args.scenarios:
+        results[scenario] = {}
+        for concurrency in args.concurrency:
+            server.clean_history()
+            server.cache_writer.flush()
+            InMemoryCacheDB.reset()
+            if scenario == "follow_up":
+                for q in queries[:3]:
+                    server.run_search(q)
+                recorder.drain()
+
+            print(f"Running {scenario} x{len(queries)} at concurrency {concurrency}...", file=sys.stderr)
+            summary = run_calls(build_calls(server, scenario, queries, embeddings, args), concurrency)
+            summary["stages"] = recorder.drain()
+            summary["peak_rss_mb"] = peak_rss_mb()
+            results[scenario][str(concurrency)] = summary
+
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            "queries": len(queries),
+            "concurrency": args.concurrency,
+            "llm_latency": args.llm_latency,
+            "llm_jitter": args.llm_jitter,
+            "use_cache": args.use_cache,
+            "k": args.k,
+        },
+        "peak_rss_mb": peak_rss_mb(),
+        "results": results,
+    }
+
+
+def compare(baseline, current, threshold):
+    """Print p50/p95 changes between two result files, flagging regressions above `threshold`."""
+    print(f"Comparing {baseline.get('commit')} -> {current.get('commit')}")
+    for scenario, levels in current["results"].items():
+        for level, summary in levels.items():
+            before = baseline.get("results", {}).get(scenario, {}).get(level)
+            if not before:
+                continue
+            rows = [("total", before["latency"], summary["latency"])]
+            for stage, stats in summary["stages"].items():
+                if stage in before.get("stages", {}):
+                    rows.append((stage, before["stages"][stage], stats))
+            for name, old, new in rows:
+                for p in ("p50_ms", "p95_ms"):
+                    if not old.get(p) or new.get(p) is None:
+                        continue
+                    change = (new[p] - old[p]) / old[p]
+                    flag = "  REGRESSION" if change > threshold else ""
+                    print(f"{scenario:>10} c={level:<3} {name:<15} {p}: {old[p]:9.1f} -> {new[p]:9.1f} ({change:+.1%}){flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark for the LegalAI search pipeline.")
+    parser.add_argument("--scenarios", type=lambda s: s.split(","), default=SCENARIOS, help=f"Comma separated subset of {SCENARIOS}")
+    parser.add_argument("--concurrency", type=lambda s: [int(c) for c in s.split(",")], default=[1, 4], help="Comma separated caller counts")
+    parser.add_argument("--queries", help="JSON file with a list of query strings")
+    parser.add_argument("--repeat", type=int, default=1, help="Repeat the query set this many times")
+    parser.add_argument("--k", type=int, default=5, help="k for direct client searches")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="Seconds each fake LLM call takes")
+    parser.add_argument("--llm-jitter", type=float, default=0.0, help="Extra uniform random seconds per fake LLM call")
+    parser.add_argument("--use-cache", action="store_true", help="Exercise the semantic cache against the in-memory store and keep the retrieval cache on")
+    parser.add_argument("--no-warmup", dest="warmup", action="store_false", help="Skip the unmeasured warm-up call")
+    parser.add_argument("--output", default="bench_results.json", help="Where to write the JSON results")
+    parser.add_argument("--compare", help="Baseline JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Relative slowdown reported as a regression")
+    parser.add_argument("--verbose", action="store_true", help="Keep the server's INFO logging")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output)
+    if args.queries:
+        args.queries = os.path.abspath(args.queries)
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+
+    report = run(args)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}", file=sys.stderr)
+
+    if baseline:
+        compare(baseline, report, args.threshold)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import hashlib
+import random
+import threading
+import time
+
+from CacheWriter import CacheWriter
+from LLMClient import GroqClient
+from Telemetry import span
+
+
+class FakeGroqClient(GroqClient):
+    """
+    Offline stand-in for GroqClient that answers every prompt after a configurable delay.
+
+    Model routing and escalation (`complete`) are inherited, so per-site metrics
+    are recorded as in production.
+    """
+
+    def __init__(self, api_key=None, latency=0.3, jitter=0.0, seed=0):
+        self.api_key = api_key or "offline-benchmark"
+        self.model = "fake-llama"
+        self.small_model = "fake-llama-small"
+        self.latency = latency
+        self.jitter = jitter
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    def chat(self, messages, model=None, site=None):
+        if isinstance(messages, str):
+            messages = [{"role": "user", "content": messages}]
+        prompt = messages[-1]["content"]
+
+        with self.lock:
+            self.calls += 1
+            delay = self.latency + self.random.uniform(0, self.jitter)
+        with span("llm", model=model or self.model):
+            if delay > 0:
+                time.sleep(delay)
+            return self.respond(prompt)
+
+    def respond(self, prompt):
+        if "Choose what domain" in prompt:
+            return '["Congressional Bills", "Executive Orders", "Supreme Court Decisions", "News Articles"]'
+        if "generate a list of keywords" in prompt:
+            question = prompt.split("The question to create queries based off of is:")[-1].split("Return the output")[0]
+            words = [w.strip("?.,\"'") for w in question.split() if len(w) > 3]
+            return "\n".join(" ".join(words[i:i + 3]) for i in range(0, min(len(words), 9), 3)) or "legal news"
+        if "Respond ONLY with JSON" in prompt:
+            return '{"needs_grounding": false, "needs_query_focus": false, "insufficient_context": false, "assessment_summary": "ok"}'
+        if "'true' or 'false'" in prompt or '"true" or "false"' in prompt:
+            return "true"
+        return (
+            "Based on the retrieved documents, the measure addresses the question directly [1]. "
+            "Related provisions and subsequent actions are described in the other sources [2][3]."
+        )
+
+
+def canned_articles(query, count=5):
+    """Deterministic Event Registry style articles for a keyword query."""
+    articles = []
+    seed = int(hashlib.md5(query.encode("utf-8")).hexdigest()[:8], 16)
+    for i in range(count):
+        sentences = [
+            f"Lawmakers continued to debate {query} this week as agencies weighed new guidance",
+            f"The proposal drew support from several committees and opposition from industry groups",
+            f"Legal analysts said the courts may ultimately decide how {query} is enforced",
+            f"The administration signaled it would issue an executive order if Congress stalls",
+            f"Observers expect further hearings before the end of the session",
+        ] * 3
+        articles.append({
+            "uri": f"canned-{seed}-{i}",
+            "title": f"Update on {query} ({i + 1})",
+            "date": "2025-01-01",
+            "body": ". ".join(sentences) + ".",
+        })
+    return articles
+
+
+class _InMemoryQuerySet(list):
+    def update(self, **fields):
+        with InMemoryCacheDB.lock:
+            for document in self:
+                for key, value in fields.items():
+                    setattr(document, key, value)
+        return len(self)
+
+
+class _InMemoryManager:
+    def __call__(self, **filters):
+        with InMemoryCacheDB.lock:
+            documents = list(InMemoryCacheDB.store)
+        for key, value in filters.items():
+            if key.endswith("__in"):
+                field = key[:-4]
+                documents = [d for d in documents if getattr(d, field) in value]
+            else:
+                documents = [d for d in documents if getattr(d, key) == value]
+        return _InMemoryQuerySet(documents)
+
+
+class InMemoryCacheDB:
+    """In-process substitute for the CacheDB Mongo document."""
+
+    store = []
+    lock = threading.Lock()
+    objects = _InMemoryManager()
+
+    def __init__(self, **fields):
+        self.id = fields.get("id")
+        self.query = fields.get("query")
+        self.answer = fields.get("answer")
+        self.embedding = fields.get("embedding", [])
+        self.evaluation = fields.get("evaluation", "neutral")
+        self.feedback = fields.get("feedback", "")
+
+    def save(self):
+        with InMemoryCacheDB.lock:
+            InMemoryCacheDB.store.append(self)
+        return self
+
+    @classmethod
+    def reset(cls):
+        with cls.lock:
+            cls.store.clear()
+
+
+class InMemoryCacheWriter(CacheWriter):
+    """CacheWriter that persists its batches to InMemoryCacheDB instead of Mongo."""
+
+    def __init__(self, **kwargs):
+        super().__init__(InMemoryCacheDB, **kwargs)
+
+    def write(self, inserts, updates):
+        for fields in inserts:
+            InMemoryCacheDB(id=fields["_id"], **{k: v for k, v in fields.items() if k != "_id"}).save()
+        for cache_id, fields in updates.items():
+            InMemoryCacheDB.objects(id=cache_id).update(**fields)
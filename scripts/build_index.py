@@ -0,0 +1,171 @@
+"""
+Embed a chunk file and write the serving assets for one corpus.
+
+Replaces the *Embedding.ipynb notebooks. For a domain it writes to src/assets:
+    {domain}.json           chunks without embeddings
+    {domain}.npy            float32 unit-length document embeddings, one row per chunk
+    {domain}.index          IndexIDMap(IndexFlatIP), ids are row numbers
+    {domain}_{dim}.index    optional Matryoshka-truncated indexes (--dims)
+    {domain}.meta.npz       filterable metadata columns (dates, congress)
+    {domain}.bm25.*         BM25 postings (varint-compressed) for hybrid search
+    {domain}.manifest.json  model, metric and a content hash per row
+
+Chunks whose content hash is already in the previous manifest reuse their
+stored embedding, so rebuilding after adding documents only encodes the new ones.
+
+Usage:
+    python scripts/build_index.py --domain opinions --chunks scripts/COURT_OPINIONS/opinion_chunks.json
+    python scripts/build_index.py --domain orders --chunks order_chunks.json --processes 4 --dims 256
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import faiss
+import numpy as np
+from tqdm import tqdm
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+from Embedder import Embedder, DOCUMENT_PREFIX
+from MetadataStore import MetadataStore
+from LexicalIndex import LexicalIndex
+from util import chunk_text, matryoshka
+
+DOMAINS = ["bills", "orders", "opinions"]
+
+
+def content_hash(model_id, text):
+    return hashlib.sha1(f"{model_id}\0{DOCUMENT_PREFIX}{text}".encode("utf-8")).hexdigest()
+
+
+def load_previous(assets, domain):
+    """Map content hash -> stored embedding row from the last build, if there was one."""
+    manifest_path = os.path.join(assets, f"{domain}.manifest.json")
+    embeddings_path = os.path.join(assets, f"{domain}.npy")
+    if not (os.path.exists(manifest_path) and os.path.exists(embeddings_path)):
+        return {}, None
+    with open(manifest_path, "r") as f:
+        manifest = json.load(f)
+    embeddings = np.load(embeddings_path, mmap_mode="r")
+    return {h: row for row, h in enumerate(manifest["hashes"])}, embeddings
+
+
+def encode_missing(embedder, texts, rows, out, batch_size, processes):
+    """Encode texts[rows] into the preallocated `out`, in blocks so progress can be reported."""
+    pool = embedder.model.start_multi_process_pool(["cpu"] * processes) if processes > 1 else None
+    block = batch_size * max(processes, 1) * 4
+    start = time.perf_counter()
+    try:
+        with tqdm(total=len(rows), unit="chunk", desc="Embedding") as progress:
+            for offset in range(0, len(rows), block):
+                block_rows = rows[offset:offset + block]
+                batch = [DOCUMENT_PREFIX + texts[i] for i in block_rows]
+                if pool is not None:
+                    vectors = embedder.encode(batch, batch_size=batch_size, pool=pool)
+                else:
+                    vectors = embedder.encode(batch, batch_size=batch_size)
+                out[block_rows] = vectors
+                progress.update(len(block_rows))
+                elapsed = time.perf_counter() - start
+                progress.set_postfix(chunks_per_sec=f"{(offset + len(block_rows)) / elapsed:.1f}")
+    finally:
+        if pool is not None:
+            embedder.model.stop_multi_process_pool(pool)
+    return time.perf_counter() - start
+
+
+def write_atomically(path, write):
+    """Write through a temporary file so a running server never reads a partial asset."""
+    tmp = f"{path}.tmp"
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def write_index(path, vectors):
+    index = faiss.IndexIDMap(faiss.IndexFlatIP(vectors.shape[1]))
+    index.add_with_ids(vectors, np.arange(len(vectors), dtype=np.int64))
+    write_atomically(path, lambda tmp: faiss.write_index(index, tmp))
+
+
+def write_json(path, data):
+    def write(tmp):
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+    write_atomically(path, write)
+
+
+def build(args):
+    with open(args.chunks, "r") as f:
+        chunks = json.load(f)
+    texts = [chunk_text(c) for c in chunks]
+
+    embedder = Embedder(args.model, backend="torch", dim=None, threads=args.threads)
+    model_id = embedder.model_id
+    hashes = [content_hash(model_id, t) for t in texts]
+    previous, previous_embeddings = ({}, None) if args.full else load_previous(args.assets, args.domain)
+
+    embeddings = np.empty((len(chunks), embedder.full_dim), dtype=np.float32)
+    missing = []
+    for row, h in enumerate(hashes):
+        old_row = previous.get(h)
+        if old_row is not None and previous_embeddings.shape[1] == embedder.full_dim:
+            embeddings[row] = previous_embeddings[old_row]
+        else:
+            missing.append(row)
+    print(f"{args.domain}: {len(chunks)} chunks, {len(chunks) - len(missing)} reused, {len(missing)} to embed", file=sys.stderr)
+
+    seconds = 0.0
+    if missing:
+        seconds = encode_missing(embedder, texts, missing, embeddings, args.batch_size, args.processes)
+        faiss.normalize_L2(embeddings)
+
+    os.makedirs(args.assets, exist_ok=True)
+    base = os.path.join(args.assets, args.domain)
+
+    def save_embeddings(tmp):
+        with open(tmp, "wb") as f:
+            np.save(f, embeddings)
+    write_atomically(f"{base}.npy", save_embeddings)
+    write_index(f"{base}.index", embeddings)
+    for dim in args.dims:
+        write_index(f"{base}_{dim}.index", matryoshka(embeddings, dim))
+    write_atomically(f"{base}.meta.npz", MetadataStore.from_chunks(chunks).save)
+    LexicalIndex.build(texts).save(f"{base}.bm25")
+    write_json(f"{base}.json", [{k: v for k, v in c.items() if k != "embedding"} for c in chunks])
+    write_json(f"{base}.manifest.json", {
+        "domain": args.domain,
+        "model": model_id,
+        "prefix": DOCUMENT_PREFIX,
+        "metric": "inner_product",
+        "normalized": True,
+        "dim": embedder.full_dim,
+        "matryoshka_dims": args.dims,
+        "count": len(chunks),
+        "built_at": datetime.now().isoformat(),
+        "hashes": hashes,
+    })
+
+    rate = len(missing) / seconds if seconds else 0.0
+    print(f"{args.domain}: embedded {len(missing)} chunks in {seconds:.1f}s ({rate:.1f} chunks/s), assets written to {base}.*", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build embeddings and FAISS indexes for a corpus.")
+    parser.add_argument("--domain", required=True, choices=DOMAINS)
+    parser.add_argument("--chunks", required=True, help="JSON list of chunks produced by the *_chunking notebooks")
+    parser.add_argument("--assets", default="src/assets")
+    parser.add_argument("--model", default="src/assets/model")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--processes", type=int, default=1, help="Encoding worker processes")
+    parser.add_argument("--threads", type=int, default=None, help="Torch threads for single-process encoding")
+    parser.add_argument("--dims", type=lambda s: [int(d) for d in s.split(",")], default=[], help="Matryoshka index dims, e.g. 256,128")
+    parser.add_argument("--full", action="store_true", help="Ignore the previous manifest and re-embed everything")
+    build(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
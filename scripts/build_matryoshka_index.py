@@ -0,0 +1,46 @@
+import argparse
+import os
+import sys
+
+import faiss
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+from util import matryoshka
+
+DOMAINS = ["bills", "orders", "opinions"]
+
+def load_vectors(index):
+    """Return (vectors, ids) stored in a flat index, optionally wrapped in IndexIDMap."""
+    if hasattr(index, "id_map"):
+        ids = faiss.vector_to_array(index.id_map).astype(np.int64)
+        inner = faiss.downcast_index(index.index)
+    else:
+        ids = np.arange(index.ntotal, dtype=np.int64)
+        inner = index
+    return inner.reconstruct_n(0, inner.ntotal), ids
+
+def build(domain, dim, assets="src/assets"):
+    source = os.path.join(assets, f"{domain}.index")
+    target = os.path.join(assets, f"{domain}_{dim}.index")
+
+    vectors, ids = load_vectors(faiss.read_index(source))
+    truncated = matryoshka(vectors, dim)
+
+    index = faiss.IndexIDMap(faiss.IndexFlatIP(dim))
+    index.add_with_ids(truncated, ids)
+    faiss.write_index(index, target)
+    print(f"{domain}: {len(ids)} vectors {vectors.shape[1]} -> {dim} dims, written to {target}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Build reduced-dimension indexes for EMBEDDING_DIM (Matryoshka truncation).")
+    parser.add_argument("--dim", type=int, required=True, help="Target dimension, e.g. 256")
+    parser.add_argument("--domains", type=lambda s: s.split(","), default=DOMAINS)
+    parser.add_argument("--assets", default="src/assets")
+    args = parser.parse_args()
+
+    for domain in args.domains:
+        build(domain, args.dim, args.assets)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+import faiss
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+from Embedder import Embedder
+from util import matryoshka, chunk_text
+
+QUERIES = [
+    "What bills address artificial intelligence safety?",
+    "Executive orders on federal hiring",
+    "Fourth Amendment cell phone searches",
+    "Student loan forgiveness legislation",
+    "Tariffs imposed by executive order",
+    "Second Amendment right to carry outside the home",
+]
+
+def timed_encode(embedder, texts, batch_size):
+    start = time.perf_counter()
+    embeddings = embedder.encode(texts, batch_size=batch_size)
+    return embeddings, len(texts) / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare an embedding backend/dimension against full precision PyTorch.")
+    parser.add_argument("--model", default="src/assets/model")
+    parser.add_argument("--backend", default="int8", help="torch, int8 or onnx")
+    parser.add_argument("--dim", type=int, default=None, help="Matryoshka dimension of the candidate")
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--domain", default="bills")
+    parser.add_argument("--samples", type=int, default=200, help="Number of corpus chunks to encode")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--min-cosine", type=float, default=0.99, help="Fail when mean cosine parity is below this")
+    args = parser.parse_args()
+
+    with open(f"src/assets/{args.domain}.json", "r") as f:
+        chunks = json.load(f)
+    texts = [chunk_text(c) for c in random.Random(0).sample(chunks, min(args.samples, len(chunks)))]
+    documents = [f"search_document: {t}" for t in texts if t]
+    queries = [f"search_query: {q}" for q in QUERIES]
+
+    baseline = Embedder(args.model, backend="torch", threads=args.threads)
+    candidate = Embedder(args.model, backend=args.backend, dim=args.dim, threads=args.threads)
+
+    base_docs, base_rate = timed_encode(baseline, documents, args.batch_size)
+    cand_docs, cand_rate = timed_encode(candidate, documents, args.batch_size)
+    base_queries = baseline.encode(queries)
+    cand_queries = candidate.encode(queries)
+
+    if candidate.dim:
+        base_docs_cmp, base_queries_cmp = matryoshka(base_docs, candidate.dim), matryoshka(base_queries, candidate.dim)
+    else:
+        base_docs_cmp, base_queries_cmp = base_docs, base_queries
+    def normalize(x):
+        return x / np.linalg.norm(x, axis=1, keepdims=True)
+    cosines = np.sum(normalize(base_docs_cmp) * normalize(cand_docs), axis=1)
+
+    # Retrieval parity against the indexes the server would actually load
+    full_index = faiss.read_index(f"src/assets/{args.domain}.index")
+    cand_index = faiss.read_index(f"src/assets/{args.domain}_{candidate.dim}.index") if candidate.dim else full_index
+    _, base_ids = full_index.search(np.ascontiguousarray(normalize(base_queries)), args.k)
+    _, cand_ids = cand_index.search(np.ascontiguousarray(normalize(cand_queries)), args.k)
+    overlap = np.mean([len(set(b) & set(c)) / args.k for b, c in zip(base_ids, cand_ids)])
+
+    report = {
+        "candidate": candidate.model_id,
+        "documents": len(documents),
+        "cosine_mean": float(cosines.mean()),
+        "cosine_min": float(cosines.min()),
+        f"overlap@{args.k}": float(overlap),
+        "baseline_docs_per_sec": base_rate,
+        "candidate_docs_per_sec": cand_rate,
+        "speedup": cand_rate / base_rate,
+    }
+    print(json.dumps(report, indent=2))
+    if report["cosine_mean"] < args.min_cosine:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Local stand-in for the Groq chat completions API, for exercising the LLM scheduler.
+
+Serves POST /chat/completions with per-window request and token limits for
+each model, Groq-style x-ratelimit-* headers, and 429s with retry-after once
+a window is used up.
+
+Usage:
+    python scripts/fake_groq.py --port 8099 --rpm 30 --tpm 6000
+    GROQ_BASE_URL=http://127.0.0.1:8099 GROQ_API_KEY=fake python src/MCPServer.py
+
+    # Serve in-process and drive it with mixed-priority traffic through GroqClient
+    python scripts/fake_groq.py --drive 60 --concurrency 12 --rpm 20
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+
+
+class RateLimits:
+    """Fixed-window request and token counters per model."""
+
+    def __init__(self, rpm, tpm, window):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.window = window
+        self.lock = threading.Lock()
+        self.windows = {}
+        self.rejected = 0
+        self.served = 0
+
+    def admit(self, model, tokens):
+        """(admitted, headers) for a request costing `tokens`."""
+        now = time.monotonic()
+        with self.lock:
+            start, requests, used = self.windows.get(model, (now, 0, 0))
+            if now - start >= self.window:
+                start, requests, used = now, 0, 0
+            reset = self.window - (now - start)
+            admitted = requests < self.rpm and used + tokens <= self.tpm
+            if admitted:
+                requests, used = requests + 1, used + tokens
+                self.served += 1
+            else:
+                self.rejected += 1
+            self.windows[model] = (start, requests, used)
+        headers = {
+            "x-ratelimit-limit-requests": str(self.rpm),
+            "x-ratelimit-remaining-requests": str(max(self.rpm - requests, 0)),
+            "x-ratelimit-reset-requests": f"{reset:.2f}s",
+            "x-ratelimit-limit-tokens": str(self.tpm),
+            "x-ratelimit-remaining-tokens": str(max(self.tpm - used, 0)),
+            "x-ratelimit-reset-tokens": f"{reset:.2f}s",
+        }
+        if not admitted:
+            headers["retry-after"] = str(math.ceil(reset))
+        return admitted, headers
+
+
+def make_handler(limits, latency):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if not self.path.endswith("/chat/completions"):
+                self.send_error(404)
+                return
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            prompt = " ".join(str(m.get("content", "")) for m in body.get("messages", []))
+            prompt_tokens = len(prompt) // 4 + 1
+            completion_tokens = 40
+
+            admitted, headers = limits.admit(body.get("model", ""), prompt_tokens + completion_tokens)
+            if not admitted:
+                self.reply(429, {"error": {"message": "Rate limit reached", "type": "tokens"}}, headers)
+                return
+
+            time.sleep(latency)
+            content = "true" if "'true' or 'false'" in prompt or '"true" or "false"' in prompt else "A fake answer citing [1]."
+            self.reply(200, {
+                "choices": [{"message": {"role": "assistant", "content": content}}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens},
+            }, headers)
+
+        def reply(self, status, data, headers):
+            payload = json.dumps(data).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(args):
+    limits = RateLimits(args.rpm, args.tpm, args.window)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(limits, args.latency))
+    return server, limits
+
+
+def drive(args, server, limits):
+    """Send a burst of mixed-priority requests through GroqClient and report per class."""
+    os.environ["GROQ_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ.setdefault("GROQ_API_KEY", "fake")
+    from LLMClient import GroqClient
+    from LLMScheduler import LLMShed, llm_priority
+
+    client = GroqClient()
+    rng = random.Random(0)
+    # (label, site, background)
+    mix = [("interactive", "generation", False)] * 4 + [("evaluation", "verify", False)] * 2 + \
+          [("redraft", "redraft", False)] * 2 + [("background", "generation", True)] * 2
+    jobs = [rng.choice(mix) for _ in range(args.drive)]
+    results = defaultdict(lambda: {"ok": 0, "shed": 0, "failed": 0, "seconds": []})
+    lock = threading.Lock()
+
+    def run(job):
+        label, site, background = job
+        start = time.perf_counter()
+        outcome = "ok"
+        try:
+            if background:
+                with llm_priority("background"):
+                    client.chat("Summarize the bill. Answer:", site=site)
+            else:
+                client.chat("Is the response grounded? Only say 'true' or 'false'.", site=site)
+        except LLMShed:
+            outcome = "shed"
+        except Exception:
+            outcome = "failed"
+        with lock:
+            results[label][outcome] += 1
+            results[label]["seconds"].append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        list(pool.map(run, jobs))
+    elapsed = time.perf_counter() - start
+
+    print(f"{args.drive} requests in {elapsed:.1f}s, endpoint served {limits.served} and rejected {limits.rejected} with 429")
+    print(f"{'class':<12} {'ok':>4} {'shed':>5} {'failed':>6} {'p50 s':>7} {'p95 s':>7}")
+    for label in ("interactive", "evaluation", "redraft", "background"):
+        r = results[label]
+        if not r["seconds"]:
+            continue
+        seconds = np.array(r["seconds"])
+        print(f"{label:<12} {r['ok']:>4} {r['shed']:>5} {r['failed']:>6} {np.percentile(seconds, 50):>7.2f} {np.percentile(seconds, 95):>7.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rate-limited fake of the Groq chat completions API.")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--rpm", type=int, default=30, help="Requests per window per model")
+    parser.add_argument("--tpm", type=int, default=6000, help="Tokens per window per model")
+    parser.add_argument("--window", type=float, default=60.0, help="Rate limit window in seconds")
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds per completion")
+    parser.add_argument("--drive", type=int, default=0, help="Send this many requests through GroqClient, report and exit")
+    parser.add_argument("--concurrency", type=int, default=8, help="Client threads when driving")
+    args = parser.parse_args()
+
+    if args.drive:
+        args.port = 0
+    server, limits = serve(args)
+    if not args.drive:
+        print(f"Fake Groq API on http://127.0.0.1:{server.server_address[1]}", file=sys.stderr)
+        server.serve_forever()
+        return
+
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        drive(args, server, limits)
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
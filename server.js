@@ -8,8 +8,19 @@ const __dirname = path.dirname(__filename);
 
 const app = express();
 const PORT = process.env.PORT || 3000;
+// Tools only reachable through the token-protected /api/admin routes
+const ADMIN_TOOLS = new Set(['profile', 'ingest']);
+
+function requireAdmin(req, res, next) {
+    if (!process.env.ADMIN_TOKEN || req.get('x-admin-token') !== process.env.ADMIN_TOKEN) {
+        return res.status(403).json({ error: 'Admin token required' });
+    }
+    next();
+}
 
 app.use(express.static(path.join(__dirname, 'public')));
+// Admin requests are authenticated before their (possibly large) bodies are parsed
+app.use('/api/admin', requireAdmin, express.json({ limit: process.env.ADMIN_BODY_LIMIT || '50mb' }));
 app.use(express.json());
 
 // Initialize MCP client on server start
@@ -20,11 +31,25 @@ app.get('/', (req, res) => {
 });
 
 app.post('/api/mcp', async (req, res) => {
+    // Cancel the tool call if the browser goes away before it is answered
+    const controller = new AbortController();
+    res.on('close', () => {
+        if (!res.writableEnded) controller.abort();
+    });
+
+    if (ADMIN_TOOLS.has(req.body?.name)) {
+        return res.status(403).json({ error: `${req.body.name} is only available through /api/admin` });
+    }
+
     try {
         console.log('Received MCP request:', req.body);
-        const result = await mcpClient.callTool(req.body);
+        const result = await mcpClient.callTool(req.body, { signal: controller.signal });
         res.json(result);
     } catch (error) {
+        if (controller.signal.aborted) {
+            console.log('Client disconnected, cancelled MCP tool call:', req.body?.name);
+            return;
+        }
         console.error('MCP tool call error:', error);
         res.status(500).json({
             error: error.message,
@@ -33,6 +58,57 @@ app.post('/api/mcp', async (req, res) => {
     }
 });
 
+// Capture a CPU/memory profile of the MCP server, e.g.
+// curl -X POST -H "x-admin-token: $ADMIN_TOKEN" -H 'Content-Type: application/json' \
+//      -d '{"seconds": 30}' 'http://localhost:3000/api/admin/profile?download=1' -o profile.speedscope.json
+app.post('/api/admin/profile', async (req, res) => {
+    const args = req.body || {};
+    const seconds = Number(args.seconds) || 10;
+    try {
+        const result = await mcpClient.callTool(
+            { name: 'profile', arguments: args },
+            { timeout: (seconds + 30) * 1000 }
+        );
+        if (result.isError) {
+            return res.status(500).json({ error: result.content?.[0]?.text });
+        }
+        const profile = JSON.parse(result.content[0].text);
+        if (req.query.download) {
+            const speedscope = profile.format === 'speedscope';
+            res.attachment(speedscope ? 'profile.speedscope.json' : 'profile.collapsed.txt');
+            return res.send(speedscope ? JSON.stringify(profile.profile) : profile.profile);
+        }
+        res.json(profile);
+    } catch (error) {
+        console.error('Profile capture failed:', error);
+        res.status(500).json({
+            error: error.message,
+            details: error.toString()
+        });
+    }
+});
+
+// Add chunks to a running corpus; `merge: true` also rewrites src/assets
+app.post('/api/admin/ingest', async (req, res) => {
+    try {
+        // Embedding a large batch can outlast the SDK's 60s default
+        const result = await mcpClient.callTool(
+            { name: 'ingest', arguments: req.body || {} },
+            { timeout: 10 * 60 * 1000 }
+        );
+        if (result.isError) {
+            return res.status(400).json({ error: result.content?.[0]?.text });
+        }
+        res.json(JSON.parse(result.content[0].text));
+    } catch (error) {
+        console.error('Ingest failed:', error);
+        res.status(500).json({
+            error: error.message,
+            details: error.toString()
+        });
+    }
+});
+
 const server = app.listen(PORT, () => {
     console.log(`Server running on http://localhost:${PORT}`);
 });
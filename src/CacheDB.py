@@ -5,7 +5,7 @@ class CacheDB(Document):
     query = StringField(required=True)
     answer = StringField(required=True)
     embedding = ListField(FloatField(), required=True)
-    evaluation = StringField(required=True, enum=["good", "bad", "neutral"])
+    evaluation = StringField(required=True, choices=["good", "bad", "neutral"])
     feedback = StringField(required=True)
     createdAt = DateTimeField(required=True, default=datetime.now)    
 
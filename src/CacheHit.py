@@ -12,7 +12,7 @@ def cache_hit(query_embedding, similarity_threshold: float = 0.85):
     cached_entries = CacheDB.objects(evaluation__in=["good", "neutral"])
     
     if not cached_entries:
-        return None, None, 0
+        return None, None, 0, None
     
     best_match = None
     best_similarity = 0.0
@@ -24,6 +24,6 @@ def cache_hit(query_embedding, similarity_threshold: float = 0.85):
             best_match = entry
     
     if best_similarity >= similarity_threshold:
-        return best_match.answer, best_match.query, best_similarity
+        return best_match.answer, best_match.query, best_similarity, str(best_match.id)
     
-    return None, None, 0
\ No newline at end of file
+    return None, None, 0, None
\ No newline at end of file
@@ -0,0 +1,117 @@
+import os
+import time
+import queue
+import logging
+import threading
+from datetime import datetime
+from bson import ObjectId
+from pymongo import UpdateOne
+from mongoengine import ValidationError
+from Telemetry import span
+
+class CacheWriter:
+    """
+    Write-behind persistence for the semantic cache.
+
+    `add` and `update` only enqueue and return immediately. A background thread
+    drains the queue in batches of up to CACHE_WRITE_BATCH operations, waiting
+    at most CACHE_WRITE_INTERVAL seconds to fill one, and writes each batch with
+    one `insert_many` and one `bulk_write`. Cache ids are ObjectIds generated
+    here, so they can go back to the client before the insert lands and later
+    feedback is a single keyed update.
+    """
+
+    def __init__(self, document, batch_size=None, interval=None):
+        self.document = document
+        self.batch_size = int(batch_size or os.getenv("CACHE_WRITE_BATCH", 100))
+        self.interval = float(interval or os.getenv("CACHE_WRITE_INTERVAL", 0.5))
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.run, name="cache-writer", daemon=True)
+        self.thread.start()
+
+    def add(self, query, answer, embedding, evaluation="neutral", feedback=""):
+        """Queue a new cache entry and return its id."""
+        cache_id = ObjectId()
+        self.queue.put(("insert", cache_id, {
+            "_id": cache_id,
+            "query": query,
+            "answer": answer,
+            "embedding": [float(x) for x in embedding],
+            "evaluation": evaluation,
+            "feedback": feedback,
+            "createdAt": datetime.now(),
+        }))
+        return str(cache_id)
+
+    def update(self, cache_id, **fields):
+        """Queue a change to an entry; bad ids and values raise ValueError here rather than failing in the batch."""
+        if not ObjectId.is_valid(cache_id):
+            raise ValueError(f"Invalid cache id: {cache_id!r}")
+        self.validate(**fields)
+        self.queue.put(("update", ObjectId(cache_id), fields))
+
+    def validate(self, **fields):
+        """Check fields against the document schema, which the raw bulk writes skip."""
+        for name, value in fields.items():
+            field = self.document._fields.get(name)
+            if field is None:
+                raise ValueError(f"Unknown cache field: {name}")
+            if field.choices and value not in field.choices:
+                raise ValueError(f"Invalid {name} {value!r}, expected one of {list(field.choices)}")
+            try:
+                field.validate(value)
+            except ValidationError as e:
+                raise ValueError(f"Invalid {name} {value!r}: {e.message}") from None
+
+    def flush(self):
+        """Block until everything queued so far has been written."""
+        self.queue.join()
+
+    def close(self, timeout=10):
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join(timeout)
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.interval
+            while batch[-1] is not None and len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self.write_batch([op for op in batch if op is not None])
+            for _ in batch:
+                self.queue.task_done()
+            if batch[-1] is None:
+                return
+
+    def write_batch(self, ops):
+        if not ops:
+            return
+        # Updates to entries inserted in the same batch are folded into the insert
+        inserts, updates = {}, {}
+        for kind, cache_id, fields in ops:
+            if kind == "insert":
+                inserts[cache_id] = fields
+            elif cache_id in inserts:
+                inserts[cache_id].update(fields)
+            else:
+                updates.setdefault(cache_id, {}).update(fields)
+        try:
+            with span("cache_write", inserts=len(inserts), updates=len(updates)):
+                self.write(list(inserts.values()), updates)
+        except Exception as e:
+            logging.error(f"ERROR: Failed to write {len(inserts)} cache entries and {len(updates)} updates: {e}")
+
+    def write(self, inserts, updates):
+        collection = self.document._get_collection()
+        if inserts:
+            collection.insert_many(inserts, ordered=False)
+        if updates:
+            collection.bulk_write([UpdateOne({"_id": cache_id}, {"$set": fields}) for cache_id, fields in updates.items()], ordered=False)
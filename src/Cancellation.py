@@ -0,0 +1,93 @@
+import threading
+import contextvars
+from contextlib import contextmanager
+
+_token = contextvars.ContextVar("cancel_token", default=None)
+
+class Cancelled(BaseException):
+    """
+    The client that made the request has gone away.
+
+    A BaseException, like asyncio.CancelledError, so the pipeline's
+    `except Exception` fallbacks do not swallow it.
+    """
+
+
+class CancelToken:
+    """
+    Cooperative cancellation for one request.
+
+    The pipeline calls `check` between stages and stops with Cancelled once
+    `cancel` has been called. Blocking waits (LLM scheduler queue, HTTP calls)
+    register callbacks so they wake up as soon as that happens.
+    """
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.callbacks = []
+        self.lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        return self.event.is_set()
+
+    def cancel(self):
+        with self.lock:
+            if self.event.is_set():
+                return
+            self.event.set()
+            callbacks, self.callbacks = self.callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def add_callback(self, callback):
+        """Run `callback` on cancel (right away if already cancelled); returns a function that removes it."""
+        with self.lock:
+            if not self.event.is_set():
+                self.callbacks.append(callback)
+                return lambda: self.remove_callback(callback)
+        callback()
+        return lambda: None
+
+    def remove_callback(self, callback):
+        with self.lock:
+            if callback in self.callbacks:
+                self.callbacks.remove(callback)
+
+    def check(self):
+        if self.event.is_set():
+            raise Cancelled("Request cancelled by the client")
+
+    def wait(self, future):
+        """Block until `future` is done, raising Cancelled if the token fires first."""
+        done = threading.Event()
+        future.add_done_callback(lambda _: done.set())
+        remove = self.add_callback(done.set)
+        try:
+            done.wait()
+        finally:
+            remove()
+        if not future.done():
+            self.check()
+        return future.result()
+
+
+@contextmanager
+def cancel_scope(token):
+    """Make `token` the current request's token inside the block (and threads started from it)."""
+    reset = _token.set(token)
+    try:
+        yield token
+    finally:
+        _token.reset(reset)
+
+
+def current_token():
+    return _token.get()
+
+
+def check_cancelled():
+    """Raise Cancelled if the current request has been cancelled; a no-op outside one."""
+    token = _token.get()
+    if token is not None:
+        token.check()
@@ -0,0 +1,100 @@
+import re
+import numpy as np
+from Telemetry import span
+
+SENTENCE = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'(\[§])")
+
+class ContextPacker:
+    """
+    Fits retrieved context into a token budget before it goes into a prompt.
+
+    Tokens are counted with the embedding model's local tokenizer, which tracks
+    the LLM's count closely enough for budgeting without a network call. When
+    the context is over budget, every source keeps its header and an equal
+    share of the budget; longer texts keep only the sentences most similar to
+    the query embedding, in their original order.
+    """
+
+    def __init__(self, model):
+        self.model = model
+
+    @property
+    def tokenizer(self):
+        return getattr(self.model, "tokenizer", None)
+
+    def count(self, text):
+        return self.counts([text])[0]
+
+    def counts(self, texts):
+        if not texts:
+            return []
+        if self.tokenizer is None:
+            return [len(t) // 4 + 1 for t in texts]
+        return [len(ids) for ids in self.tokenizer(list(texts), add_special_tokens=False)["input_ids"]]
+
+    def truncate(self, text, budget):
+        """First `budget` tokens of `text`."""
+        if budget <= 0:
+            return ""
+        if self.tokenizer is None:
+            return text[:budget * 4]
+        ids = self.tokenizer(text, add_special_tokens=False)["input_ids"]
+        return text if len(ids) <= budget else self.tokenizer.decode(ids[:budget])
+
+    def pack(self, entries, query_embedding=None, budget=None):
+        """Join (header, text) entries into one block of at most about `budget` tokens."""
+        if not budget or not entries:
+            return "\n\n".join(head + text for head, text in entries)
+
+        head_tokens = self.counts([head for head, _ in entries])
+        text_tokens = self.counts([text for _, text in entries])
+        if sum(head_tokens) + sum(text_tokens) <= budget:
+            return "\n\n".join(head + text for head, text in entries)
+
+        shares = self.allocate(text_tokens, max(budget - sum(head_tokens), 0))
+        with span("context_pack", entries=len(entries), budget=budget):
+            packed = []
+            for (head, text), tokens, share in zip(entries, text_tokens, shares):
+                if tokens > share:
+                    text = self.trim(text, query_embedding, share)
+                packed.append(head + text)
+        return "\n\n".join(packed)
+
+    @staticmethod
+    def allocate(sizes, budget):
+        """Split `budget` evenly, handing what short entries don't need to the longer ones."""
+        shares = [0] * len(sizes)
+        remaining = budget
+        order = sorted(range(len(sizes)), key=lambda i: sizes[i])
+        for n, i in enumerate(order):
+            shares[i] = min(sizes[i], remaining // (len(sizes) - n))
+            remaining -= shares[i]
+        return shares
+
+    def trim(self, text, query_embedding, budget):
+        """Keep the sentences of `text` most relevant to the query that fit in `budget` tokens."""
+        sentences = [s for s in SENTENCE.split(text) if s.strip()]
+        if budget <= 0 or not sentences:
+            return ""
+        tokens = self.counts(sentences)
+
+        order = list(range(len(sentences)))
+        if query_embedding is not None and len(sentences) > 1:
+            embeddings = self.model.encode_document(sentences)
+            query = np.asarray(query_embedding, dtype=np.float32).reshape(-1)
+            scores = embeddings @ query / (np.linalg.norm(embeddings, axis=1) * np.linalg.norm(query) + 1e-12)
+            order = list(np.argsort(-scores, kind="stable"))
+
+        keep, used = [], 0
+        for i in order:
+            if used + tokens[i] <= budget:
+                keep.append(i)
+                used += tokens[i]
+        if not keep:
+            return self.truncate(sentences[order[0]], budget)
+
+        keep.sort()
+        parts = [sentences[keep[0]]]
+        for previous, i in zip(keep, keep[1:]):
+            parts.append(("... " if i > previous + 1 else "") + sentences[i])
+        return " ".join(parts)
@@ -0,0 +1,104 @@
+import os
+import logging
+import threading
+from Telemetry import span
+
+class ConversationMemory:
+    """
+    Conversation turns for follow-up prompts, kept within a token budget.
+
+    Turns are {"query", "previous_response"} dicts, as before. Recent turns are
+    kept verbatim; when the rendered history outgrows HISTORY_TOKENS, all but
+    the latest turn are folded into a rolling summary written by the LLM.
+
+    Appending never waits for that summary: it is written on a background
+    thread, and `render` waits for it only if it is still running. The LLM is
+    never called while `lock` is held.
+    """
+
+    def __init__(self, packer, llm_client, budget=None):
+        self.packer = packer
+        self.llm_client = llm_client
+        self.budget = int(budget or os.getenv("HISTORY_TOKENS", 800))
+        self.summary = ""
+        self.turns = []
+        self.lock = threading.Lock()
+        # Held for a whole compression, so only one summary is written at a time
+        self.compressing = threading.Lock()
+        self.generation = 0
+
+    def __len__(self):
+        return len(self.turns)
+
+    def append(self, turn):
+        with self.lock:
+            self.turns.append(turn)
+            over_budget = self.over_budget()
+        if over_budget:
+            threading.Thread(target=self.compress, name="history-summary", daemon=True).start()
+
+    def clear(self):
+        with self.lock:
+            self.turns.clear()
+            self.summary = ""
+            self.generation += 1
+
+    def render(self):
+        self.compress()
+        with self.lock:
+            return self.format()
+
+    def format(self):
+        parts = [f"Summary of earlier conversation: {self.summary}"] if self.summary else []
+        parts.extend(f"Query: {t['query']}\nResponse: {t['previous_response']}" for t in self.turns)
+        return "\n\n".join(parts)
+
+    def over_budget(self):
+        return self.packer.count(self.format()) > self.budget
+
+    def compress(self):
+        """Fold all but the latest turn into the summary until the history fits the budget."""
+        with self.compressing:
+            while True:
+                with self.lock:
+                    if not self.over_budget():
+                        return
+                    folded, summary, generation = self.turns[:-1], self.summary, self.generation
+                if not folded:
+                    break
+                summary = self.summarize(summary, folded)
+                with self.lock:
+                    if generation != self.generation:
+                        # Cleared while the summary was being written
+                        return
+                    self.summary = summary
+                    del self.turns[:len(folded)]
+
+            # A single long answer can still be over budget on its own
+            with self.lock:
+                overflow = self.packer.count(self.format()) - self.budget
+                if overflow > 0 and self.turns:
+                    latest = self.turns[-1]
+                    response = latest["previous_response"]
+                    keep = max(self.packer.count(response) - overflow, 0)
+                    self.turns[-1] = {**latest, "previous_response": self.packer.truncate(response, keep)}
+
+    def summarize(self, summary, turns):
+        transcript = "\n\n".join(f"Query: {t['query']}\nResponse: {t['previous_response']}" for t in turns)
+        limit = self.budget // 2
+        try:
+            with span("history_summary", turns=len(turns)):
+                summary = self.llm_client.complete("history_summary", f"""
+                Update the running summary of a conversation about U.S. legislation, executive orders and court decisions.
+                Keep the topics asked about, the bills, orders and cases named, and the conclusions reached.
+                Use at most {limit} tokens and return only the summary.
+
+                Current summary: {summary or "(none)"}
+                New turns: {transcript}
+
+                Updated summary:
+                """)
+        except Exception as e:
+            logging.error(f"ERROR: Failed to summarize conversation history: {e}")
+            summary = f"{summary} {transcript}".strip()
+        return self.packer.truncate(summary.strip(), limit)
@@ -0,0 +1,347 @@
+import os
+import faiss
+import json
+import logging
+import threading
+import numpy as np
+import networkx as nx
+from GraphRAG import GraphRAG
+from LexicalIndex import LexicalIndex
+from MetadataStore import MetadataStore
+from RetrievalCache import RetrievalCache
+from Telemetry import span
+from util import matryoshka, chunk_text
+
+# FAISS keeps its own OpenMP pool; configure it here rather than process-wide.
+faiss.omp_set_num_threads(int(os.getenv("FAISS_THREADS", 1)))
+
+class CorpusSnapshot:
+    """
+    Everything a search reads, swapped as one reference.
+
+    `index` is the main index and `delta` holds chunks ingested since the last
+    merge. `chunks` is an append-only list shared between snapshots: a snapshot
+    never returns ids beyond its own `count`, so appending is invisible to it.
+    """
+
+    def __init__(self, index, delta, chunks, count, embeddings, graph, metadata, lexical, version):
+        self.index = index
+        self.delta = delta
+        self.chunks = chunks
+        self.count = count
+        self.embeddings = embeddings
+        self.graph = graph
+        self.metadata = metadata
+        self.lexical = lexical
+        self.version = version
+
+class DomainClient:
+    """FAISS retrieval and GraphRAG reranking over one corpus in src/assets."""
+
+    def __init__(self, name, dim=None):
+        self.name = name
+        self.dim = dim
+        self.index_path = f"src/assets/{name}_{dim}.index" if dim else f"src/assets/{name}.index"
+        self.chunks_path = f"src/assets/{name}.json"
+        self.graph_path = f"src/assets/{name}_knowledge_graph.gexf"
+        self.metadata_path = f"src/assets/{name}.meta.npz"
+        self.lexical_path = f"src/assets/{name}.bm25"
+        self.hybrid = os.getenv("HYBRID_SEARCH", "1") != "0"
+        self.rrf_k = int(os.getenv("RRF_K", 60))
+        self.merge_threshold = int(os.getenv("INGEST_MERGE_THRESHOLD", 5000))
+        self.cache = RetrievalCache() if os.getenv("RETRIEVAL_CACHE", "1") == "1" else None
+        # Set by `shard`; BM25 hits outside this shard's ids are masked out
+        self.shard_mask = None
+        self.write_lock = threading.Lock()
+
+        index = faiss.read_index(self.index_path)
+        with open(self.chunks_path, "r") as f:
+            chunks = json.load(f)
+
+        # Corpora built by scripts/build_index.py keep embeddings in a .npy file
+        # next to the chunks instead of inside the JSON.
+        embeddings = None
+        embeddings_path = f"src/assets/{name}.npy"
+        if os.path.exists(embeddings_path):
+            embeddings = np.load(embeddings_path, mmap_mode="r")
+            if dim:
+                embeddings = matryoshka(embeddings, dim)
+        elif dim:
+            self.truncate_embeddings(chunks, dim)
+
+        metadata = MetadataStore.load(self.metadata_path, chunks)
+        lexical = None
+        if self.hybrid:
+            if not os.path.exists(f"{self.lexical_path}.json"):
+                logging.info(f"No BM25 index for {name}, building it in memory (run scripts/build_index.py to precompute it)")
+            lexical = LexicalIndex.load(self.lexical_path, [chunk_text(c) for c in chunks])
+        self.snapshot = CorpusSnapshot(index, None, chunks, len(chunks), embeddings, GraphRAG.load_graph(self.graph_path), metadata, lexical, 0)
+
+    @property
+    def index(self):
+        return self.snapshot.index
+
+    @property
+    def chunks(self):
+        return self.snapshot.chunks
+
+    @property
+    def version(self):
+        return self.snapshot.version
+
+    @staticmethod
+    def truncate_embeddings(chunks, dim):
+        """Bring the stored chunk embeddings down to the query dimension used by the index."""
+        rows = [i for i, c in enumerate(chunks) if "embedding" in c]
+        if not rows:
+            return
+        truncated = matryoshka(np.array([chunks[i]["embedding"] for i in rows], dtype=np.float32), dim)
+        for i, embedding in zip(rows, truncated):
+            chunks[i]["embedding"] = embedding.tolist()
+
+    def search(self, query, query_embedding, k=5, filters=None, prefetched=None):
+        return self.batch_search([query], query_embedding, k, filters, prefetched)[0]
+
+    def prefetch(self, queries, query_embeddings, k=5, filters=None):
+        """
+        The FAISS and BM25 stage of `batch_search`, without GraphRAG. Passing the
+        result back as `prefetched` finishes the search, so speculative retrieval
+        only spends NER and scoring on the domains it keeps.
+        """
+        snapshot = self.snapshot
+        return snapshot, self.candidates(snapshot, queries, query_embeddings, k, filters)
+
+    def batch_search(self, queries, query_embeddings, k=5, filters=None, prefetched=None):
+        """
+        Search the index once with the full (n, d) query matrix, then rerank each row.
+
+        `filters` (see MetadataStore.parse_filters) restricts the search to matching
+        chunks inside FAISS, so a filtered search still returns up to k results.
+        With hybrid search on, each row is fused with the BM25 ranking before
+        GraphRAG reranking.
+
+        With RETRIEVAL_CACHE on, rows whose embedding is a near-duplicate of a
+        recent query with the same identifier terms, against the same snapshot,
+        reuse its reranked context.
+        """
+        snapshot, hits = prefetched if prefetched is not None else (self.snapshot, None)
+        if self.cache is None:
+            return self.retrieve(snapshot, queries, query_embeddings, k, filters, hits=hits)
+
+        with span("retrieval_cache", domain=self.name) as attributes:
+            results = [self.cache.get(snapshot.version, k, filters, query, embedding) for query, embedding in zip(queries, query_embeddings)]
+            missing = [row for row, result in enumerate(results) if result is None]
+            attributes["hits"] = len(queries) - len(missing)
+        if missing:
+            retrieved = self.retrieve(
+                snapshot, [queries[row] for row in missing], query_embeddings[missing], k, filters,
+                hits=[hits[row] for row in missing] if hits is not None else None,
+            )
+            for row, context in zip(missing, retrieved):
+                self.cache.put(snapshot.version, k, filters, queries[row], query_embeddings[row], context)
+                results[row] = context
+        return results
+
+    def batch_tag(self, queries, query_embeddings, k=5, filters=None):
+        """
+        `batch_search` without the final GraphRAG score: each hit keeps its
+        `distance` and entity `counter`, so results from several shards can be
+        merged before they are scored (see RemoteDomainClient).
+        """
+        return self.retrieve(self.snapshot, queries, query_embeddings, k, filters, score=False)
+
+    def retrieve(self, snapshot, queries, query_embeddings, k, filters, score=True, hits=None):
+        if hits is None:
+            hits = self.candidates(snapshot, queries, query_embeddings, k, filters)
+        return [self.rerank(query, row_hits, snapshot, score) for query, row_hits in zip(queries, hits)]
+
+    def candidates(self, snapshot, queries, query_embeddings, k, filters):
+        """(chunk id, similarity) hits per query from FAISS, fused with BM25 when hybrid search is on."""
+        # `bitmap` backs the selector and has to outlive the FAISS calls below
+        params, bitmap = snapshot.metadata.selector(filters) if filters else (None, None)
+        with span("faiss", domain=self.name, k=k, queries=len(queries), filtered=bool(filters)):
+            D, I = snapshot.index.search(query_embeddings, k=k, params=params)
+            if snapshot.delta is not None and snapshot.delta.ntotal:
+                D, I = self.merge_results(D, I, *snapshot.delta.search(query_embeddings, k=k, params=params), k)
+
+        mask = snapshot.metadata.mask(filters) if filters else None
+        if self.shard_mask is not None:
+            mask = self.shard_mask if mask is None else mask & self.shard_mask
+        results = []
+        for row, query in enumerate(queries):
+            hits = [(int(i), self.similarity(d)) for d, i in zip(D[row], I[row]) if 0 <= i < snapshot.count]
+            if snapshot.lexical is not None:
+                with span("bm25", domain=self.name, k=k):
+                    lexical = snapshot.lexical.search(query, k, mask)
+                hits = self.fuse(hits, lexical, query_embeddings[row], snapshot, k)
+            results.append(hits)
+        return results
+
+    def merge_results(self, D, I, delta_D, delta_I, k):
+        D = np.concatenate([D, delta_D], axis=1)
+        I = np.concatenate([I, delta_I], axis=1)
+        order = np.argsort(-D if self.index.metric_type == faiss.METRIC_INNER_PRODUCT else D, axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(D, order, axis=1), np.take_along_axis(I, order, axis=1)
+
+    def similarity(self, d):
+        """
+        Score a FAISS result as `1 - squared L2` between unit vectors (2cos - 1).
+
+        The original notebook indexes are IndexFlatL2 and every threshold downstream
+        is tuned on that scale, so inner product indexes are mapped onto it too.
+        """
+        if self.index.metric_type == faiss.METRIC_INNER_PRODUCT:
+            return float(2*d - 1)
+        return float(1-d)
+
+    def fuse(self, hits, lexical, query_embedding, snapshot, k):
+        """
+        Reciprocal rank fusion of the vector hits and BM25 ids, keeping the top k.
+
+        Chunks found only by BM25 are scored against the query embedding, so every
+        hit carries a similarity on the same scale for GraphRAG.
+        """
+        fused = {}
+        for rank, (i, _) in enumerate(hits):
+            fused[i] = 1 / (self.rrf_k + rank + 1)
+        for rank, i in enumerate(lexical):
+            fused[i] = fused.get(i, 0) + 1 / (self.rrf_k + rank + 1)
+
+        similarities = dict(hits)
+        top = sorted(fused, key=fused.get, reverse=True)[:k]
+        return [(i, similarities[i] if i in similarities else self.embedding_similarity(i, query_embedding, snapshot)) for i in top]
+
+    def embedding_similarity(self, i, query_embedding, snapshot):
+        embedding = self.chunk(i, snapshot).get("embedding")
+        if embedding is None or len(embedding) != len(query_embedding):
+            return -1.0
+        embedding = np.asarray(embedding, dtype=np.float32)
+        cosine = np.dot(embedding, query_embedding) / (np.linalg.norm(embedding) * np.linalg.norm(query_embedding))
+        return float(2*cosine - 1)
+
+    def chunk(self, i, snapshot=None):
+        snapshot = snapshot or self.snapshot
+        if snapshot.embeddings is None or i >= len(snapshot.embeddings):
+            return snapshot.chunks[i]
+        return {**snapshot.chunks[i], "embedding": snapshot.embeddings[i]}
+
+    def rerank(self, query, hits, snapshot=None, score=True):
+        """GraphRAG rerank of (chunk id, similarity) hits; with `score` off the hits are only tagged."""
+        snapshot = snapshot or self.snapshot
+        context = []
+        for i, similarity in hits:
+            context.append({
+                "chunk": self.chunk(i, snapshot),
+                "distance": similarity
+            })
+        if not context:
+            return context
+        context.sort(key=lambda x: x["distance"], reverse=True)
+
+        with span("graphrag_load", domain=self.name):
+            graph_rag = GraphRAG(self.graph_path, query, graph=snapshot.graph)
+        if not score:
+            return graph_rag.tag_entities(context)
+        return graph_rag.filter_entities(context)
+
+    def shard(self, shard, shards):
+        """
+        Keep only this shard's slice of the vector index: chunk ids with
+        `id % shards == shard`. Ids stay global, so results from all shards
+        merge by chunk. Used by RetrievalService before it starts serving.
+        """
+        with self.write_lock:
+            old = self.snapshot
+            if hasattr(old.index, "id_map"):
+                ids = faiss.vector_to_array(old.index.id_map).astype(np.int64)
+                vectors = faiss.downcast_index(old.index.index).reconstruct_n(0, old.index.ntotal)
+            else:
+                ids = np.arange(old.index.ntotal, dtype=np.int64)
+                vectors = old.index.reconstruct_n(0, old.index.ntotal)
+            keep = ids % shards == shard
+            index = self.empty_index()
+            index.add_with_ids(np.ascontiguousarray(vectors[keep]), ids[keep])
+            del vectors
+            self.shard_mask = np.arange(old.count) % shards == shard
+            self.snapshot = CorpusSnapshot(index, old.delta, old.chunks, old.count, old.embeddings, old.graph, old.metadata, old.lexical, old.version + 1)
+            logging.info(f"Serving {self.name} shard {shard + 1}/{shards}: {index.ntotal} of {len(ids)} vectors")
+
+    def empty_index(self):
+        base = faiss.IndexFlatIP(self.index.d) if self.index.metric_type == faiss.METRIC_INNER_PRODUCT else faiss.IndexFlatL2(self.index.d)
+        return faiss.IndexIDMap(base)
+
+    def ingest(self, new_chunks, embeddings):
+        """
+        Add chunks to the running corpus without blocking searches.
+
+        `embeddings` are unit-length document vectors at the serving dimension.
+        The chunks go into the delta index and the knowledge graph, then the new
+        snapshot is published with a single reference swap. In-flight searches
+        keep the snapshot they started with.
+        """
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32).reshape(len(new_chunks), -1)
+        with self.write_lock:
+            old = self.snapshot
+            ids = np.arange(old.count, old.count + len(new_chunks), dtype=np.int64)
+
+            with span("ingest_index", domain=self.name, chunks=len(new_chunks)):
+                delta = faiss.clone_index(old.delta) if old.delta is not None else self.empty_index()
+                delta.add_with_ids(embeddings, ids)
+
+            stored = []
+            for chunk, embedding in zip(new_chunks, embeddings):
+                chunk = {**chunk, "embedding": embedding.tolist()}
+                stored.append(chunk)
+            with span("ingest_graph", domain=self.name, chunks=len(new_chunks)):
+                graph = GraphRAG(self.graph_path, "", graph=old.graph).extend({int(i): chunk_text(c) for i, c in zip(ids, stored)})
+
+            metadata = old.metadata.extend(stored)
+            lexical = old.lexical.extend([chunk_text(c) for c in stored]) if old.lexical is not None else None
+            old.chunks.extend(stored)
+            self.snapshot = CorpusSnapshot(old.index, delta, old.chunks, old.count + len(stored), old.embeddings, graph, metadata, lexical, old.version + 1)
+            logging.info(f"Ingested {len(stored)} {self.name} chunks (delta size {delta.ntotal}, version {self.snapshot.version})")
+
+        if delta.ntotal >= self.merge_threshold:
+            self.merge()
+        return self.snapshot.version
+
+    def merge(self, persist=False):
+        """Fold the delta index into a fresh copy of the main index and swap it in."""
+        with self.write_lock:
+            old = self.snapshot
+            if old.delta is None or old.delta.ntotal == 0:
+                return old.version
+            with span("ingest_merge", domain=self.name, chunks=old.delta.ntotal):
+                delta_ids = faiss.vector_to_array(old.delta.id_map).astype(np.int64)
+                delta_vectors = faiss.downcast_index(old.delta.index).reconstruct_n(0, old.delta.ntotal)
+                index = faiss.clone_index(old.index)
+                index.add_with_ids(delta_vectors, delta_ids)
+                lexical = old.lexical
+                if lexical is not None:
+                    lexical = lexical.compact([chunk_text(c) for c in old.chunks[lexical.segments[0].count:old.count]])
+            self.snapshot = CorpusSnapshot(index, None, old.chunks, old.count, old.embeddings, old.graph, old.metadata, lexical, old.version + 1)
+            logging.info(f"Merged {len(delta_ids)} chunks into the {self.name} index (version {self.snapshot.version})")
+            if persist:
+                self.persist(self.snapshot)
+            return self.snapshot.version
+
+    def persist(self, snapshot):
+        """Write the merged index, chunk store and graph back to src/assets."""
+        if snapshot.embeddings is not None or self.dim:
+            logging.warning(f"Not persisting {self.name}: rebuild with scripts/build_index.py to keep ingested chunks")
+            return
+
+        def write_chunks(path):
+            with open(path, "w") as f:
+                json.dump(snapshot.chunks[:snapshot.count], f)
+
+        for path, write in (
+            (self.index_path, lambda tmp: faiss.write_index(snapshot.index, tmp)),
+            (self.chunks_path, write_chunks),
+            (self.graph_path, lambda tmp: nx.write_gexf(snapshot.graph, tmp)),
+            (self.metadata_path, snapshot.metadata.save),
+        ):
+            write(f"{path}.tmp")
+            os.replace(f"{path}.tmp", path)
+        if snapshot.lexical is not None:
+            LexicalIndex.build([chunk_text(c) for c in snapshot.chunks[:snapshot.count]]).save(self.lexical_path)
@@ -1,4 +1,6 @@
 import json
+import logging
+from LLMScheduler import LLMShed
 from typing import List, Dict, Any
 
 class DrafterAgent:
@@ -26,24 +28,31 @@ Respond ONLY with JSON:
     "assessment_summary": "brief explanation"
 }}"""
         
-        response_content = self.llm_client.chat(
-            messages=[
-                {"role": "system", "content": "You are an expert evaluator. Return only valid JSON."},
-                {"role": "user", "content": prompt}
-            ],
-        )
-
         try:
-            content = response_content.strip()
-            if content.startswith("```json"):
-                content = content[7:]
-            if content.endswith("```"):
-                content = content[:-3]
-            return json.loads(content.strip())
+            return self.llm_client.complete(
+                "assess",
+                messages=[
+                    {"role": "system", "content": "You are an expert evaluator. Return only valid JSON."},
+                    {"role": "user", "content": prompt}
+                ],
+                parse=self.parse_assessment,
+            )
         except Exception as e:
             print(f"Error parsing assessment JSON: {e}")
             return {"needs_grounding": False, "needs_query_focus": False, "sufficient_context": True, "assessment_summary": "Error parsing assessment"}
     
+    @staticmethod
+    def parse_assessment(response_content):
+        content = response_content.strip()
+        if content.startswith("```json"):
+            content = content[7:]
+        if content.endswith("```"):
+            content = content[:-3]
+        assessment = json.loads(content.strip())
+        if not isinstance(assessment, dict):
+            raise ValueError("Assessment is not a JSON object")
+        return assessment
+
     def draft(self, query, answer, formatted_context):
         assessment = self.assess(query, answer, formatted_context)
         if answer and not any([assessment.get("needs_grounding"), assessment.get("needs_query_focus"), assessment.get("insufficient_context")]):
@@ -71,11 +80,16 @@ Respond ONLY with JSON:
         
         Answer:"""
 
-        response = self.llm_client.chat(
-            messages=[
-                {"role": "system", "content": "You are an expert in medical diagnostic devices. Provide clear, well-grounded answers."},
-                {"role": "user", "content": prompt}
-            ],
-        )
+        try:
+            response = self.llm_client.complete(
+                "redraft",
+                messages=[
+                    {"role": "system", "content": "You are an expert in medical diagnostic devices. Provide clear, well-grounded answers."},
+                    {"role": "user", "content": prompt}
+                ],
+            )
+        except LLMShed:
+            logging.warning("Redraft shed under LLM load, keeping the original answer")
+            return answer
         
         return response
\ No newline at end of file
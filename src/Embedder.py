@@ -0,0 +1,121 @@
+import os
+import sys
+import logging
+import numpy as np
+from sentence_transformers import SentenceTransformer
+from util import matryoshka
+from EmbeddingCache import EmbeddingCache
+from InferenceBatcher import InferenceBatcher
+
+BACKENDS = ("torch", "int8", "onnx")
+
+# nomic-embed-text task prefixes; the corpus indexes were built with DOCUMENT_PREFIX
+QUERY_PREFIX = "search_query: "
+DOCUMENT_PREFIX = "search_document: "
+
+# Leave cores for FAISS and the worker pools; one thread on macOS, where torch
+# and FAISS ship separate OpenMP runtimes
+DEFAULT_THREADS = 1 if sys.platform == "darwin" else min(4, os.cpu_count() or 1)
+
+class Embedder:
+    """
+    nomic-embed-text-v1.5 behind a selectable CPU backend.
+
+    Backends (EMBEDDING_BACKEND):
+        torch - full precision PyTorch, the original behaviour
+        int8  - PyTorch with dynamic int8 quantization of the Linear layers
+        onnx  - ONNX Runtime; EMBEDDING_ONNX_FILE picks the model file inside
+                the model directory (e.g. onnx/model_quantized.onnx for int8)
+
+    EMBEDDING_DIM applies Matryoshka truncation (768, 512, 256, 128 or 64) and
+    must match the `*_{dim}.index` files built by scripts/build_matryoshka_index.py.
+    EMBEDDING_THREADS sets torch's intra-op thread count. That setting is
+    process-wide, so it also covers GLiNER; with the onnx backend it sets the
+    ONNX Runtime session's threads as well.
+
+    encode_query/encode_document add the nomic task prefix and go through an
+    EmbeddingCache, so repeated texts are only encoded once. Cache misses go
+    through an InferenceBatcher, so concurrent requests share forward passes;
+    INFERENCE_BATCHING=0 encodes on the calling thread instead.
+    """
+
+    def __init__(self, path="src/assets/model", backend=None, dim=None, threads=None, cache=None):
+        self.path = path
+        self.backend = backend or os.getenv("EMBEDDING_BACKEND", "torch")
+        if self.backend not in BACKENDS:
+            raise ValueError(f"Unknown embedding backend {self.backend!r}, expected one of {BACKENDS}")
+        self.dim = int(dim or os.getenv("EMBEDDING_DIM", 0)) or None
+        self.threads = int(threads or os.getenv("EMBEDDING_THREADS", 0)) or DEFAULT_THREADS
+        self.model = self.load()
+        self.full_dim = self.model.get_sentence_embedding_dimension()
+        if self.dim == self.full_dim:
+            self.dim = None
+        self.model_id = f"{os.path.basename(os.path.normpath(path))}:{self.backend}:{self.dim or self.full_dim}"
+        self.cache = cache if cache is not None else EmbeddingCache()
+        self.batcher = None
+        if os.getenv("INFERENCE_BATCHING", "1") == "1":
+            self.batcher = InferenceBatcher("embedding", lambda texts: self.encode(texts, batch_size=max(32, self.batcher.max_size)))
+        logging.info(f"Loaded embedding model {self.model_id}")
+
+    def load(self):
+        import torch
+        torch.set_num_threads(self.threads)
+        if self.backend == "onnx":
+            return self.load_onnx()
+
+        model = SentenceTransformer(self.path, trust_remote_code=True)
+        if self.backend == "int8":
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        return model
+
+    def load_onnx(self):
+        import onnxruntime as ort
+
+        session_options = ort.SessionOptions()
+        session_options.intra_op_num_threads = self.threads
+        session_options.inter_op_num_threads = 1
+        model_kwargs = {"provider": "CPUExecutionProvider", "session_options": session_options}
+        onnx_file = os.getenv("EMBEDDING_ONNX_FILE")
+        if onnx_file:
+            model_kwargs["file_name"] = onnx_file
+        return SentenceTransformer(self.path, backend="onnx", trust_remote_code=True, model_kwargs=model_kwargs)
+
+    @property
+    def tokenizer(self):
+        return self.model.tokenizer
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim or self.full_dim
+
+    def encode(self, sentences, batch_size=32, **kwargs):
+        """Same contract as SentenceTransformer.encode, returning float32 numpy arrays."""
+        embeddings = np.asarray(self.model.encode(sentences, batch_size=batch_size, **kwargs), dtype=np.float32)
+        if self.dim:
+            embeddings = matryoshka(embeddings, self.dim)
+        return embeddings
+
+    def encode_query(self, texts, batch_size=32):
+        return self.encode_cached(texts, QUERY_PREFIX, batch_size)
+
+    def encode_document(self, texts, batch_size=32):
+        return self.encode_cached(texts, DOCUMENT_PREFIX, batch_size)
+
+    def encode_cached(self, texts, prefix, batch_size=32):
+        """Encode `prefix + text` for each text, reusing cached vectors; a single string gives a 1-D array."""
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        keys = [EmbeddingCache.key(self.model_id, prefix, t) for t in texts]
+        vectors = [self.cache.get(key) for key in keys]
+
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        if missing:
+            inputs = [prefix + texts[i] for i in missing]
+            encoded = self.batcher.run(inputs) if self.batcher else self.encode(inputs, batch_size=batch_size)
+            for i, vector in zip(missing, encoded):
+                vectors[i] = self.cache.put(keys[i], vector)
+
+        if single:
+            return vectors[0]
+        if not vectors:
+            return np.empty((0, self.get_sentence_embedding_dimension()), dtype=np.float32)
+        return np.ascontiguousarray(np.stack(vectors))
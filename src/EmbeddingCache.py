@@ -0,0 +1,76 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+class EmbeddingCache:
+    """
+    LRU cache of embeddings keyed on (model id, prefix, text hash).
+
+    An optional SQLite file (EMBEDDING_CACHE_PATH) acts as a second tier that
+    survives restarts. Returned vectors are contiguous, read-only float32
+    arrays so they can be handed straight to FAISS.
+    """
+
+    def __init__(self, max_entries=None, path=None):
+        self.max_entries = int(max_entries or os.getenv("EMBEDDING_CACHE_SIZE", 10000))
+        self.path = path if path is not None else os.getenv("EMBEDDING_CACHE_PATH")
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.db = None
+        if self.path:
+            self.db = sqlite3.connect(self.path, check_same_thread=False)
+            self.db.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB)")
+            self.db.commit()
+
+    @staticmethod
+    def key(model_id, prefix, text):
+        digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        return f"{model_id}|{prefix}|{digest}"
+
+    def get(self, key):
+        with self.lock:
+            vector = self.entries.get(key)
+            if vector is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return vector
+            if self.db is not None:
+                row = self.db.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    vector = self.freeze(np.frombuffer(row[0], dtype=np.float32))
+                    self.remember(key, vector)
+                    self.hits += 1
+                    return vector
+            self.misses += 1
+            return None
+
+    def put(self, key, vector):
+        vector = self.freeze(vector)
+        with self.lock:
+            self.remember(key, vector)
+            if self.db is not None:
+                self.db.execute("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", (key, vector.tobytes()))
+                self.db.commit()
+        return vector
+
+    def remember(self, key, vector):
+        self.entries[key] = vector
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    @staticmethod
+    def freeze(vector):
+        vector = np.ascontiguousarray(vector, dtype=np.float32).copy()
+        vector.flags.writeable = False
+        return vector
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses}
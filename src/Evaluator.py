@@ -11,7 +11,7 @@ class Evaluator:
         self.response = response
         self.model = model
         self.llm_client = llm_client
-        self.response_embedding = np.array(self.model.encode(self.response), dtype=np.float32).flatten()
+        self.response_embedding = np.array(self.model.encode_document(self.response), dtype=np.float32).flatten()
     
     def evaluate(self):
         if not self.context:
@@ -24,7 +24,7 @@ class Evaluator:
         if context_query < 0.7 or answer_query < 0.7 or context_answer < 0.7:
             drafter = DrafterAgent(self.llm_client)
             new_response = drafter.draft(self.query, self.formatted_context, self.response)
-            new_response_embedding = np.array(self.model.encode(new_response), dtype=np.float32).flatten()
+            new_response_embedding = np.array(self.model.encode_document(new_response), dtype=np.float32).flatten()
             new_answer_query = float(1-cosine_similarity(self.query_embedding, new_response_embedding))
             new_context_answer = float(1-cosine_similarity(np.array(self.context[0]["chunk"]["embedding"], dtype=np.float32).flatten(), new_response_embedding))
             if new_answer_query > answer_query or new_context_answer > context_answer:
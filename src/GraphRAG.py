@@ -1,13 +1,27 @@
 from gliner import GLiNER
 import networkx as nx
 import numpy as np
+import os
+import logging
+import itertools
+import threading
+from Telemetry import span
+from InferenceBatcher import InferenceBatcher
+from util import chunk_text
 
 class GraphRAG:
-    def __init__(self, graph_path, query):
+    # The graphs and the GLiNER model are read-only at query time, so they are
+    # loaded once per process and shared by every GraphRAG instance.
+    _graphs = {}
+    _model = None
+    _batcher = None
+    _lock = threading.Lock()
+
+    def __init__(self, graph_path, query, graph=None):
         self.graph_path = graph_path
-        self.graph = nx.read_gexf(self.graph_path)
+        self.graph = graph if graph is not None else GraphRAG.load_graph(self.graph_path)
         self.query = query
-        self.model = GLiNER.from_pretrained("urchade/gliner_medium-v2.1")
+        self.model = GraphRAG.load_model()
         if "bills" in self.graph_path:
             self.labels = [
                             # People & Roles
@@ -51,44 +65,134 @@ class GraphRAG:
                             "Date", "Location", "Topic"
                         ]
 
+    @classmethod
+    def load_graph(cls, graph_path):
+        with cls._lock:
+            if graph_path not in cls._graphs:
+                cls._graphs[graph_path] = nx.read_gexf(graph_path)
+            return cls._graphs[graph_path]
+
+    @classmethod
+    def load_model(cls):
+        with cls._lock:
+            if cls._model is None:
+                cls._model = GLiNER.from_pretrained("urchade/gliner_medium-v2.1")
+                if os.getenv("INFERENCE_BATCHING", "1") == "1":
+                    cls._batcher = InferenceBatcher("gliner", cls.predict_batch)
+            return cls._model
+
+    @classmethod
+    def predict_batch(cls, requests):
+        """Entities for each (text, labels) request, one GLiNER call per label set."""
+        results = [None] * len(requests)
+        groups = {}
+        for i, (_, labels) in enumerate(requests):
+            groups.setdefault(labels, []).append(i)
+        for labels, indices in groups.items():
+            entities = cls._model.batch_predict_entities([requests[i][0] for i in indices], list(labels))
+            for i, found in zip(indices, entities):
+                results[i] = found
+        return results
+
+    def predict_entities(self, texts):
+        """GLiNER entities for each text, batched with other requests in flight."""
+        if GraphRAG._batcher is None:
+            return [self.model.predict_entities(text, self.labels) for text in texts]
+        labels = tuple(self.labels)
+        return GraphRAG._batcher.run([(text, labels) for text in texts])
+
+    def extend(self, chunks):
+        """
+        Return a copy of the graph with new chunks merged in.
+
+        `chunks` maps chunk id to text. Mirrors the knowledge_graph_gliner notebooks:
+        a Chunk node MENTIONS each entity and co-occurring entities are linked
+        with a weight that grows with every co-occurrence.
+        """
+        graph = self.graph.copy()
+        chunks = {chunk_id: text for chunk_id, text in chunks.items() if text and len(text) >= 50}
+        for (chunk_id, text), entities in zip(chunks.items(), self.predict_entities(list(chunks.values()))):
+            node = f"chunk_{chunk_id}"
+            graph.add_node(node, type="Chunk", text=text[:50]+"...")
+
+            names = []
+            for entity in entities:
+                name = entity['text'].strip()
+                if name not in graph:
+                    graph.add_node(name, type=entity['label'])
+                graph.add_edge(node, name, relation="MENTIONS")
+                names.append(name)
+
+            for e1, e2 in itertools.combinations(names, 2):
+                if not graph.has_edge(e1, e2):
+                    graph.add_edge(e1, e2, relation="CO_OCCURS", weight=1)
+                else:
+                    graph[e1][e2]['weight'] = graph[e1][e2].get('weight', 0) + 1
+        return graph
+
     def filter_entities(self, context):
         tags = self.traverse()
+        return self.entities_from_context(context, tags, GraphRAG.max_distance(context))
+
+    def tag_entities(self, context):
+        """
+        Count each chunk's entities that neighbour the query's, without scoring.
+
+        Used by sharded retrieval services: the coordinator merges the tagged
+        chunks from every shard and then calls `score` once.
+        """
+        tags = self.traverse()
+        with span("graphrag_ner", target="context", chunks=len(context)):
+            self.count_tags(context, tags)
+        return context
+
+    @staticmethod
+    def max_distance(context):
+        """Normaliser for `score`, from context sorted by distance, best first."""
         max_distance = context[0]["distance"]
         if max_distance == 0:
             max_distance = context[-1]["distance"]
-        return self.entities_from_context(context, tags, max_distance)
+        return max_distance
 
     def traverse(self):
-        entities = self.model.predict_entities(self.query, self.labels)
+        with span("graphrag_ner", target="query"):
+            entities = self.predict_entities([self.query])[0]
         keys = [e['text'].strip() for e in entities]
 
         tags = []
-        for key in keys:
-            try:
-                tags.extend(list(self.graph.neighbors(key)))
-            except:
-                pass
+        with span("graphrag_traverse", entities=len(keys)):
+            for key in keys:
+                try:
+                    tags.extend(list(self.graph.neighbors(key)))
+                except:
+                    pass
 
         return tags
     
     def entities_from_context(self, context, tags, max_distance):
-        for c in context:
-            try:
-                # bills & orders
-                entities = self.model.predict_entities(c["chunk"]["chunk_text"]["text"], self.labels)
-            except:
-                try:
-                    # opinions
-                    entities = self.model.predict_entities(c["chunk"]["text"], self.labels)
-                except:
-                    entities = []
-            keys = [e['text'].strip() for e in entities]
+        with span("graphrag_ner", target="context", chunks=len(context)):
+            self.count_tags(context, tags)
+        return self.score(context, max_distance)
+
+    def count_tags(self, context, tags):
+        texts = [chunk_text(c.get("chunk") or {}) for c in context]
+        found = {}
+        indices = [i for i, text in enumerate(texts) if text]
+        try:
+            found = dict(zip(indices, self.predict_entities([texts[i] for i in indices])))
+        except Exception as e:
+            logging.error(f"ERROR: Entity extraction over {len(indices)} chunks failed: {e}")
+
+        for i, c in enumerate(context):
+            keys = [e['text'].strip() for e in found.get(i, [])]
             counter = 0
             for key in keys:
                 if key in tags:
                     counter += 1
             c["counter"] = counter
 
+    @staticmethod
+    def score(context, max_distance):
         context.sort(key=lambda x: x["counter"], reverse=True)
         max_tags = context[0]["counter"]
         if max_tags == 0:
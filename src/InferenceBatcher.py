@@ -0,0 +1,98 @@
+import os
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+from Telemetry import record_batch
+
+class InferenceBatcher:
+    """
+    Dynamic micro-batching in front of a model.
+
+    Callers `run` a list of inputs from any thread. One worker thread takes the
+    first waiting request, then collects others for up to BATCH_MAX_WAIT_MS or
+    until BATCH_MAX_SIZE inputs are gathered. It makes one `predict` call for
+    all of them and hands each caller its slice of the outputs. While a batch
+    is running, new requests pile up and go out together in the next one, so
+    concurrent requests share forward passes instead of running many batches
+    of one. No batch holds more than BATCH_MAX_SIZE inputs: a larger request
+    (an ingest or batch_search encode) is sent a slice at a time, and the
+    requests that arrive meanwhile go ahead of its remaining slices.
+
+    `predict` takes a list of inputs and returns one output per input, in order.
+    """
+
+    def __init__(self, name, predict, max_size=None, max_wait_ms=None):
+        self.name = name
+        self.predict = predict
+        self.max_size = int(max_size or os.getenv("BATCH_MAX_SIZE", 32))
+        self.max_wait = float(max_wait_ms or os.getenv("BATCH_MAX_WAIT_MS", 2)) / 1000
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.loop, name=f"{name}-batcher", daemon=True)
+        self.thread.start()
+
+    def submit(self, inputs):
+        """Queue `inputs` and return a Future for their outputs."""
+        future = Future()
+        inputs = list(inputs)
+        if not inputs:
+            future.set_result([])
+            return future
+        self.queue.put({"inputs": inputs, "future": future, "outputs": []})
+        return future
+
+    def run(self, inputs):
+        return self.submit(inputs).result()
+
+    def loop(self):
+        active = []
+        while True:
+            if not active:
+                active.append(self.queue.get())
+            while True:
+                try:
+                    active.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            deadline = time.monotonic() + self.max_wait
+            while sum(len(r["inputs"]) - len(r["outputs"]) for r in active) < self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    active.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            # Least-dispatched requests go first, so a large job is sent one
+            # slice per batch and requests that arrive meanwhile share the next
+            active.sort(key=lambda r: len(r["outputs"]))
+            batch, size = [], 0
+            for request in active:
+                if size >= self.max_size:
+                    break
+                start = len(request["outputs"])
+                end = min(len(request["inputs"]), start + self.max_size - size)
+                batch.append((request, start, end))
+                size += end - start
+            record_batch(self.name, size, self.queue.qsize() + len(active) - len(batch))
+            self.dispatch(batch)
+            active = [r for r in active if not r["future"].done()]
+
+    def dispatch(self, batch):
+        inputs = [x for request, start, end in batch for x in request["inputs"][start:end]]
+        try:
+            outputs = self.predict(inputs)
+        except Exception as e:
+            logging.error(f"ERROR: {self.name} batch of {len(inputs)} failed: {e}")
+            for request, _, _ in batch:
+                request["future"].set_exception(e)
+            return
+
+        offset = 0
+        for request, start, end in batch:
+            request["outputs"].extend(outputs[offset:offset + end - start])
+            offset += end - start
+            if len(request["outputs"]) == len(request["inputs"]):
+                request["future"].set_result(request["outputs"])
@@ -1,27 +1,112 @@
 import os
+import time
+import logging
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from Cancellation import current_token, check_cancelled
+from Telemetry import span, record_llm_usage, record_llm_call, record_llm_shed
+from LLMScheduler import LLMScheduler, LLMShed, PRIORITIES, context_priority
 
 load_dotenv()
 
+# Classification and extraction prompts whose output is parsed; these go to the
+# small model unless LLM_MODEL_<SITE> says otherwise.
+SMALL_MODEL_SITES = ("choose_domain", "news_keywords", "assess", "verify", "sufficiency_check", "history_summary")
+
+# Scheduler priority class per call site; unlisted sites are interactive
+SITE_PRIORITIES = {
+    "verify": "evaluation",
+    "assess": "evaluation",
+    "redraft": "evaluation",
+    "history_summary": "evaluation",
+}
+
+# Optional work that is dropped when it has queued for LLM_SHED_AFTER seconds
+SHEDDABLE_SITES = ("assess", "redraft", "history_summary")
+
+# Completion tokens reserved per request when checking the token budget
+COMPLETION_ESTIMATE = 512
+
+def parse_true_false(reply):
+    """Boolean from a 'true'/'false' guardrail reply; raises if it is neither."""
+    reply = reply.strip().lower()
+    if "true" in reply and "false" not in reply:
+        return True
+    if "false" in reply and "true" not in reply:
+        return False
+    raise ValueError(f"Expected 'true' or 'false', got {reply[:50]!r}")
+
 class GroqClient:
-    """Client for Llama 3.3 via Groq API."""
+    """
+    Client for Groq chat models.
+
+    Answers use LLM_MODEL (Llama 3.3 70B); call sites in SMALL_MODEL_SITES use
+    LLM_SMALL_MODEL (Llama 3.1 8B) through `complete`.
+    """
     
     def __init__(self, api_key=None):
         self.api_key = api_key or os.getenv("GROQ_API_KEY")
         if not self.api_key:
             raise ValueError("GROQ_API_KEY environment variable is required")
         
-        self.base_url = "https://api.groq.com/openai/v1"
-        self.model = "llama-3.3-70b-versatile"
+        self.base_url = os.getenv("GROQ_BASE_URL", "https://api.groq.com/openai/v1")
+        self.scheduler = LLMScheduler.shared()
+        # Runs requests made on behalf of a cancellable search, so the caller can stop waiting
+        self.http_pool = ThreadPoolExecutor(max_workers=self.scheduler.max_concurrency * 2, thread_name_prefix="groq-http")
+        self.max_retries = int(os.getenv("LLM_MAX_RETRIES", 2))
+        self.shed_after = float(os.getenv("LLM_SHED_AFTER", 5))
+        self.model = os.getenv("LLM_MODEL", "llama-3.3-70b-versatile")
+        self.small_model = os.getenv("LLM_SMALL_MODEL", "llama-3.1-8b-instant")
+
+    def route(self, site):
+        """Model for a call site: LLM_MODEL_<SITE>, else small for SMALL_MODEL_SITES, else large."""
+        return os.getenv(f"LLM_MODEL_{site.upper()}") or (self.small_model if site in SMALL_MODEL_SITES else self.model)
+
+    def complete(self, site, messages, parse=None):
+        """
+        Run the prompt for `site` on its routed model.
+
+        With `parse`, returns parse(reply). A reply from a smaller model that
+        fails to parse is retried once on the large model; if that also fails
+        the parse error is raised.
+        """
+        model = self.route(site)
+        escalated = False
+        start = time.perf_counter()
+        try:
+            reply = self.chat(messages, model=model, site=site)
+            if parse is None:
+                return reply
+            try:
+                return parse(reply)
+            except Exception as e:
+                if model == self.model:
+                    raise
+                logging.warning(f"Could not parse {model} reply for {site} ({e}), escalating to {self.model}")
+                escalated = True
+                model = self.model
+                return parse(self.chat(messages, model=model, site=site))
+        finally:
+            record_llm_call(site, model, time.perf_counter() - start, escalated)
     
-    def chat(self, messages, model=None):
+    def priority(self, site):
+        """The site's priority class, lowered to the caller's llm_priority() if that is lower."""
+        priority = SITE_PRIORITIES.get(site, "interactive")
+        override = context_priority()
+        if override is not None and PRIORITIES[override] > PRIORITIES[priority]:
+            return override
+        return priority
+
+    def chat(self, messages, model=None, site=None):
         """
-        Send a chat completion request to Groq.
+        Send a chat completion request to Groq through the shared LLMScheduler.
         
         Args:
             messages: List of message dicts with 'role' and 'content'
             model: Optional model override
+            site: Call site, which sets the priority class and whether the
+                request may be shed (LLMShed) when the queue is backed up
             
         Returns:
             String response content
@@ -42,11 +127,45 @@ class GroqClient:
             "temperature": 0.7
         }
         
-        try:
-            response = requests.post(url, json=payload, headers=headers, timeout=120)
-            response.raise_for_status()
-            data = response.json()
-            
-            return data["choices"][0]["message"]["content"]
-        except requests.exceptions.RequestException as e:
-            raise Exception(f"Groq API request failed: {e}")
+        model = payload["model"]
+        priority = self.priority(site)
+        deadline = time.monotonic() + self.shed_after if site in SHEDDABLE_SITES else None
+        tokens = sum(len(str(m.get("content", ""))) for m in messages) // 4 + COMPLETION_ESTIMATE
+
+        for attempt in range(self.max_retries + 1):
+            check_cancelled()
+            try:
+                with span("llm_queue", priority=priority):
+                    self.scheduler.acquire(model, priority, tokens, deadline)
+            except LLMShed:
+                record_llm_shed(site)
+                raise
+
+            status, response_headers = None, None
+            try:
+                with span("llm", model=model) as attributes:
+                    response = self.post(url, payload, headers)
+                    status, response_headers = response.status_code, response.headers
+                    if status == 429 and attempt < self.max_retries:
+                        attributes["rate_limited"] = True
+                        continue
+                    response.raise_for_status()
+                    data = response.json()
+                    record_llm_usage(attributes, model, data.get("usage"))
+
+                    return data["choices"][0]["message"]["content"]
+            except requests.exceptions.RequestException as e:
+                raise Exception(f"Groq API request failed: {e}")
+            finally:
+                self.scheduler.release(model, status, response_headers)
+
+    def post(self, url, payload, headers):
+        """
+        POST the request; when the search it belongs to is cancelled, stop
+        waiting for the reply and raise Cancelled. The abandoned request
+        finishes on the HTTP pool and its reply is dropped.
+        """
+        token = current_token()
+        if token is None:
+            return requests.post(url, json=payload, headers=headers, timeout=120)
+        return token.wait(self.http_pool.submit(requests.post, url, json=payload, headers=headers, timeout=120))
@@ -0,0 +1,216 @@
+import os
+import re
+import time
+import heapq
+import itertools
+import threading
+import contextvars
+from contextlib import contextmanager
+from Cancellation import current_token
+
+# Lower runs first
+PRIORITIES = {"interactive": 0, "evaluation": 1, "background": 2}
+
+_priority = contextvars.ContextVar("llm_priority", default=None)
+
+class LLMShed(Exception):
+    """Optional LLM work dropped because it waited in the queue past its deadline."""
+
+
+@contextmanager
+def llm_priority(name):
+    """Run LLM calls made inside the block at no higher than priority class `name`."""
+    token = _priority.set(name)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def context_priority():
+    return _priority.get()
+
+
+def parse_duration(value):
+    """Groq reset headers such as "7.66s", "2m59.56s" or "120ms", in seconds."""
+    if not value:
+        return None
+    units = {"h": 3600, "m": 60, "s": 1, "ms": 0.001}
+    parts = re.findall(r"(\d+(?:\.\d+)?)(ms|h|m|s)", str(value))
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(n) * units[unit] for n, unit in parts)
+
+
+class TokenBucket:
+    """
+    Refilling budget, synced from the API's remaining/reset headers.
+
+    Unlimited until the first response says otherwise.
+    """
+
+    def __init__(self):
+        self.capacity = None
+        self.level = float("inf")
+        self.rate = 0.0
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        if self.capacity is not None:
+            self.level = min(self.capacity, self.level + self.rate * (now - self.updated))
+        self.updated = now
+
+    def delay(self, amount, now):
+        """Seconds until `amount` is available."""
+        self.refill(now)
+        amount = min(amount, self.capacity) if self.capacity is not None else amount
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate if self.rate > 0 else 1.0
+
+    def take(self, amount):
+        self.level -= amount
+
+    def sync(self, limit, remaining, reset, now):
+        if limit is None or remaining is None:
+            return
+        self.capacity = float(limit)
+        self.level = float(remaining)
+        # Refill so the bucket is full again when the API says the window resets
+        self.rate = (self.capacity - self.level) / reset if reset else self.capacity / 60
+        self.updated = now
+
+
+class LLMScheduler:
+    """
+    Admission control shared by every GroqClient in the process.
+
+    Callers queue by priority class (interactive answers before evaluation
+    before background batch work, FIFO within a class). Once fewer than
+    LLM_MAX_CONCURRENCY requests are in flight, the first waiter whose model's
+    request and token buckets, kept in sync with Groq's x-ratelimit-* headers,
+    can cover it is admitted. A 429 pauses admission for that model until its
+    retry-after has passed. An exhausted or backed-off model therefore only
+    holds up its own callers, which stay in FIFO order among themselves. Work that can be skipped gives a
+    deadline and is shed with LLMShed if it is still queued when it expires.
+    """
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, max_concurrency=None):
+        self.max_concurrency = int(max_concurrency or os.getenv("LLM_MAX_CONCURRENCY", 4))
+        self.condition = threading.Condition()
+        self.queue = []
+        self.waiting = {}
+        self.sequence = itertools.count()
+        self.active = 0
+        self.buckets = {}
+        self.blocked_until = {}
+
+    @classmethod
+    def shared(cls):
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def model_buckets(self, model):
+        if model not in self.buckets:
+            self.buckets[model] = (TokenBucket(), TokenBucket())
+        return self.buckets[model]
+
+    def acquire(self, model, priority, tokens, deadline=None):
+        """
+        Block until this request may be sent; raises LLMShed once `deadline`
+        (monotonic) passes, and Cancelled if the caller's request is cancelled
+        while it waits.
+        """
+        ticket = (PRIORITIES.get(priority, 0), next(self.sequence))
+        token = current_token()
+        remove = token.add_callback(self.wake) if token is not None else None
+        with self.condition:
+            heapq.heappush(self.queue, ticket)
+            self.waiting[ticket] = (model, tokens)
+            try:
+                while True:
+                    if token is not None:
+                        token.check()
+                    now = time.monotonic()
+                    if deadline is not None and now >= deadline:
+                        raise LLMShed(f"Shed {priority} LLM request after queueing past its deadline")
+
+                    wait = 1.0
+                    if self.active < self.max_concurrency:
+                        wait = self.admission_delay(ticket, now)
+                        if wait <= 0:
+                            requests, token_bucket = self.model_buckets(model)
+                            requests.take(1)
+                            token_bucket.take(tokens)
+                            self.active += 1
+                            return
+                    if deadline is not None:
+                        wait = min(wait, deadline - now)
+                    self.condition.wait(max(wait, 0.001))
+            finally:
+                del self.waiting[ticket]
+                self.queue.remove(ticket)
+                heapq.heapify(self.queue)
+                self.condition.notify_all()
+                if remove is not None:
+                    remove()
+
+    def delay(self, model, tokens, now):
+        """Seconds until `model`'s block window and buckets allow a request of `tokens`."""
+        requests, token_bucket = self.model_buckets(model)
+        return max(self.blocked_until.get(model, 0) - now, requests.delay(1, now), token_bucket.delay(tokens, now))
+
+    def admission_delay(self, ticket, now):
+        """
+        Seconds until `ticket` may be admitted: it must be the first waiter whose
+        model can take a request, and no earlier waiter may be for the same model.
+        """
+        model, tokens = self.waiting[ticket]
+        for other in sorted(self.queue):
+            if other == ticket:
+                break
+            other_model, other_tokens = self.waiting[other]
+            # An earlier waiter goes first; it notifies when it is admitted
+            if other_model == model or self.delay(other_model, other_tokens, now) <= 0:
+                return 1.0
+        return self.delay(model, tokens, now)
+
+    def wake(self):
+        with self.condition:
+            self.condition.notify_all()
+
+    def release(self, model, status=None, headers=None):
+        """Return the slot and fold the response's rate limit headers into the model's buckets."""
+        headers = headers or {}
+        now = time.monotonic()
+        with self.condition:
+            self.active -= 1
+            requests, tokens = self.model_buckets(model)
+            requests.sync(
+                headers.get("x-ratelimit-limit-requests"),
+                headers.get("x-ratelimit-remaining-requests"),
+                parse_duration(headers.get("x-ratelimit-reset-requests")),
+                now,
+            )
+            tokens.sync(
+                headers.get("x-ratelimit-limit-tokens"),
+                headers.get("x-ratelimit-remaining-tokens"),
+                parse_duration(headers.get("x-ratelimit-reset-tokens")),
+                now,
+            )
+            if status == 429:
+                retry_after = parse_duration(headers.get("retry-after")) or 1.0
+                self.blocked_until[model] = max(self.blocked_until.get(model, 0), now + retry_after)
+            self.condition.notify_all()
+
+    def stats(self):
+        with self.condition:
+            return {"active": self.active, "queued": len(self.queue)}
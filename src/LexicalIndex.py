@@ -0,0 +1,212 @@
+import json
+import math
+import os
+import re
+from collections import Counter, defaultdict
+
+import numpy as np
+
+# "H.R. 1234" -> ["hr", "1234"], "5 U.S.C. 552" -> ["5", "usc", "552"]
+TOKEN = re.compile(r"[a-z0-9]+(?:\.[a-z0-9]+)*\.?")
+
+STOPWORDS = frozenset("""
+a an and are as at be been but by can did do does for from had has have how i if in into is it its
+may no not of on or over such that the their them then there these they this those to under was
+we were what when where which who whom why will with would you your
+""".split())
+
+def tokenize(text):
+    tokens = (t.replace(".", "") for t in TOKEN.findall(text.lower()))
+    return [t for t in tokens if t and t not in STOPWORDS]
+
+
+def encode_varints(values):
+    """LEB128 varints for non-negative ints; returns the bytes and the byte length of each value."""
+    values = np.asarray(values, dtype=np.uint64)
+    lengths = np.ones(len(values), dtype=np.int64)
+    rest = values >> np.uint64(7)
+    while rest.any():
+        lengths += rest > 0
+        rest >>= np.uint64(7)
+
+    out = np.empty(int(lengths.sum()), dtype=np.uint8)
+    starts = np.cumsum(lengths) - lengths
+    rest = values.copy()
+    for j in range(int(lengths.max(initial=0))):
+        live = np.flatnonzero(lengths > j)
+        more = (lengths[live] > j + 1).astype(np.uint8) << 7
+        out[starts[live] + j] = (rest[live] & np.uint64(0x7f)).astype(np.uint8) | more
+        rest[live] >>= np.uint64(7)
+    return out, lengths
+
+
+def decode_varints(data):
+    """Inverse of encode_varints without a Python-level loop over the values."""
+    data = np.asarray(data, dtype=np.uint8)
+    if len(data) == 0:
+        return np.empty(0, dtype=np.uint64)
+    ends = np.flatnonzero(data < 0x80)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    group = np.repeat(np.arange(len(ends)), ends - starts + 1)
+    shift = ((np.arange(len(data)) - starts[group]) * 7).astype(np.uint64)
+    return np.add.reduceat((data & 0x7f).astype(np.uint64) << shift, starts)
+
+
+class Segment:
+    """
+    Postings for chunk ids [base, base + count).
+
+    Each term's postings are `df` doc id gaps followed by `df` term
+    frequencies, varint-encoded into one shared byte array that is
+    memory-mapped when loaded from disk.
+    """
+
+    def __init__(self, terms, data, offsets, df, lengths, base=0):
+        self.vocab = {term: i for i, term in enumerate(terms)}
+        self.data = data
+        self.offsets = offsets
+        self.df = df
+        self.lengths = lengths
+        self.base = base
+        self.count = len(lengths)
+        self.total_length = int(lengths.sum())
+
+    @classmethod
+    def build(cls, texts, base=0):
+        postings = defaultdict(list)
+        lengths = np.zeros(len(texts), dtype=np.int32)
+        for doc, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            lengths[doc] = sum(counts.values())
+            for term, tf in counts.items():
+                postings[term].append((base + doc, tf))
+
+        terms = sorted(postings)
+        df = np.array([len(postings[t]) for t in terms], dtype=np.int32)
+        values = []
+        for term in terms:
+            docs, tfs = np.array(postings[term], dtype=np.int64).T
+            values.append(np.diff(docs, prepend=0))
+            values.append(tfs)
+        data, value_lengths = encode_varints(np.concatenate(values) if values else [])
+
+        # Every term contributes 2 * df values; sum their byte lengths per term
+        term_bytes = np.add.reduceat(value_lengths, np.concatenate(([0], np.cumsum(2 * df)[:-1]))) if len(terms) else []
+        offsets = np.concatenate(([0], np.cumsum(term_bytes))).astype(np.int64)
+        return cls(terms, data, offsets, df, lengths, base)
+
+    @classmethod
+    def load(cls, path):
+        with open(f"{path}.json", "r") as f:
+            header = json.load(f)
+        columns = np.load(f"{path}.npz")
+        data = np.load(f"{path}.npy", mmap_mode="r")
+        return cls(header["terms"], data, columns["offsets"], columns["df"], columns["lengths"], header["base"])
+
+    def save(self, path):
+        terms = sorted(self.vocab, key=self.vocab.get)
+
+        def write_header(f):
+            json.dump({"base": self.base, "count": self.count, "terms": terms}, f)
+
+        for suffix, mode, write in (
+            ("npy", "wb", lambda f: np.save(f, np.asarray(self.data))),
+            ("npz", "wb", lambda f: np.savez(f, offsets=self.offsets, df=self.df, lengths=self.lengths)),
+            ("json", "w", write_header),
+        ):
+            with open(f"{path}.{suffix}.tmp", mode) as f:
+                write(f)
+            os.replace(f"{path}.{suffix}.tmp", f"{path}.{suffix}")
+
+    def doc_freq(self, term):
+        t = self.vocab.get(term)
+        return 0 if t is None else int(self.df[t])
+
+    def postings(self, term):
+        """(chunk ids, term frequencies) for `term`, or None if it never occurs."""
+        t = self.vocab.get(term)
+        if t is None:
+            return None
+        values = decode_varints(self.data[self.offsets[t]:self.offsets[t + 1]])
+        n = int(self.df[t])
+        return np.cumsum(values[:n]).astype(np.int64), values[n:].astype(np.float32)
+
+
+class LexicalIndex:
+    """
+    BM25 over chunk texts, for exact tokens such as bill and EO numbers or
+    citations that dense embeddings handle poorly.
+
+    The first segment is built offline by scripts/build_index.py; chunks ingested
+    at runtime get a segment per ingest call until the next merge compacts them.
+    Like MetadataStore, an index is never mutated, only replaced.
+    """
+
+    def __init__(self, segments, k1=1.2, b=0.75):
+        self.segments = tuple(segments)
+        self.k1 = k1
+        self.b = b
+
+    @classmethod
+    def build(cls, texts):
+        return cls([Segment.build(texts)])
+
+    @classmethod
+    def load(cls, path, texts):
+        """Memory-map the postings written by scripts/build_index.py, or build them from `texts`."""
+        if os.path.exists(f"{path}.json"):
+            segment = Segment.load(path)
+            if segment.count == len(texts):
+                return cls([segment])
+        return cls.build(texts)
+
+    def save(self, path):
+        """Write a single-segment index, e.g. one from `build`."""
+        if len(self.segments) != 1:
+            raise ValueError("Rebuild the lexical index before saving ingested segments")
+        self.segments[0].save(path)
+
+    def extend(self, texts):
+        """New index with a segment for chunks appended after the current ones."""
+        last = self.segments[-1]
+        return LexicalIndex(self.segments + (Segment.build(texts, last.base + last.count),), self.k1, self.b)
+
+    def compact(self, texts):
+        """Replace the ingestion segments with one; `texts` continue the first segment's ids."""
+        first = self.segments[0]
+        if len(self.segments) == 1:
+            return self
+        return LexicalIndex((first, Segment.build(texts, first.base + first.count)), self.k1, self.b)
+
+    @property
+    def count(self):
+        return sum(s.count for s in self.segments)
+
+    def search(self, query, k=5, mask=None):
+        """Chunk ids of the top k BM25 matches for `query`, best first; `mask` excludes ids."""
+        terms = set(tokenize(query))
+        count = self.count
+        if not terms or not count:
+            return []
+        avgdl = max(sum(s.total_length for s in self.segments) / count, 1.0)
+
+        scores = np.zeros(count, dtype=np.float32)
+        for term in terms:
+            df = sum(s.doc_freq(term) for s in self.segments)
+            if not df:
+                continue
+            idf = math.log(1 + (count - df + 0.5) / (df + 0.5))
+            for segment in self.segments:
+                found = segment.postings(term)
+                if found is None:
+                    continue
+                ids, tf = found
+                dl = segment.lengths[ids - segment.base]
+                scores[ids] += idf * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * dl / avgdl))
+
+        if mask is not None:
+            scores[~mask] = 0
+        k = min(k, count)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [int(i) for i in top if scores[i] > 0]
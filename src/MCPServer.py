@@ -1,161 +1,383 @@
 import os
 import sys
-# Fix for FAISS/Torch OpenMP conflict on macOS
-os.environ["OMP_NUM_THREADS"] = "1"
+# Fix for FAISS/Torch OpenMP conflict on macOS. Elsewhere thread counts are
+# set per library instead (FAISS_THREADS, EMBEDDING_THREADS).
+if sys.platform == "darwin":
+    os.environ.setdefault("OMP_NUM_THREADS", "1")
 os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
 
+# Trace allocations from startup so profile snapshots include the loaded
+# corpora and indexes; the value is the number of frames kept per allocation.
+TRACEMALLOC_FRAMES = os.getenv("LEGALAI_TRACEMALLOC", "")
+if TRACEMALLOC_FRAMES:
+    import tracemalloc
+    tracemalloc.start(int(TRACEMALLOC_FRAMES) if TRACEMALLOC_FRAMES.isdigit() else 1)
+
 import logging
 logging.basicConfig(level=logging.INFO, stream=sys.stderr, format='%(asctime)s - %(levelname)s - %(message)s')
-from mcp.server.fastmcp import FastMCP
+from mcp.server.fastmcp import FastMCP, Context
+import anyio
 from typing import List
 import nltk
 from nltk.corpus import stopwords
 from nltk.tokenize import word_tokenize
-from sentence_transformers import SentenceTransformer
 import numpy as np
 import mongoengine
 from dotenv import load_dotenv
 import json
 import ast
+import re
+import atexit
+import signal
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
 
 from BillClient import BillClient
-from LLMClient import GroqClient
+from Embedder import Embedder
+from LLMClient import GroqClient, parse_true_false
+from LLMScheduler import llm_priority
 from NewsClient import NewsClient
 from OrderClient import OrderClient
 from OpinionClient import OpinionClient
+from RemoteDomainClient import RemoteDomainClient, parse_services
 from Evaluator import Evaluator
 from CacheHit import cache_hit
 from CacheDB import CacheDB
-from util import cosine_similarity
+from CacheWriter import CacheWriter
+from SingleFlight import SingleFlight
+from Cancellation import CancelToken, Cancelled, cancel_scope, check_cancelled
+from MetadataStore import parse_filters
+from ContextPacker import ContextPacker
+from ConversationMemory import ConversationMemory
+from util import cosine_similarity, chunk_text
+import Profiler
+from Telemetry import span, start_trace, debug_enabled, export_metrics, start_metrics_server
 
 mcp = FastMCP("LegalAI")
 llm_client = GroqClient()
-bills = BillClient()
-orders = OrderClient()
-opinions = OpinionClient()
 
 load_dotenv()
 try:
-    model = SentenceTransformer("src/assets/model", trust_remote_code=True)
+    model = Embedder("src/assets/model")
     mongoengine.connect(host=os.getenv("MONGO_URI"))
 
 except:
-    model = SentenceTransformer("nomic-ai/nomic-embed-text-v1.5", trust_remote_code=True)
-
-convo_history = []
+    model = Embedder("nomic-ai/nomic-embed-text-v1.5")
+
+# Domains listed in RETRIEVAL_SERVICES are searched through their (sharded)
+# retrieval services; the rest are loaded into this process.
+services = parse_services(os.getenv("RETRIEVAL_SERVICES", ""))
+bills = RemoteDomainClient("bills", services["bills"]) if "bills" in services else BillClient(dim=model.dim)
+orders = RemoteDomainClient("orders", services["orders"]) if "orders" in services else OrderClient(dim=model.dim)
+opinions = RemoteDomainClient("opinions", services["opinions"]) if "opinions" in services else OpinionClient(dim=model.dim)
+domain_clients = {
+    "Congressional Bills": bills,
+    "Executive Orders": orders,
+    "Supreme Court Decisions": opinions,
+}
+
+# Prompt token budgets per call site; 0 sends the full context
+context_budgets = {
+    "search": int(os.getenv("SEARCH_CONTEXT_TOKENS", 3000)),
+    "follow_up": int(os.getenv("FOLLOW_UP_CONTEXT_TOKENS", 2000)),
+}
+packer = ContextPacker(model)
+convo_history = ConversationMemory(packer, llm_client)
 context_history = []
+cache_writer = CacheWriter(CacheDB)
+atexit.register(cache_writer.close)
+coalescer = SingleFlight()
+# Local retrieval started while the router is still choosing domains
+speculative_retrieval = os.getenv("SPECULATIVE_RETRIEVAL", "1") == "1"
+speculation_pool = ThreadPoolExecutor(max_workers=int(os.getenv("SPECULATIVE_WORKERS", 6)), thread_name_prefix="speculative")
 
 @mcp.tool()
-def search(query: str, k_bills=5, k_orders=5, k_opinions=5, domains="", use_cache: bool = False):
-    context = []
+async def search(query: str, k_bills: int = 5, k_orders: int = 5, k_opinions: int = 5, domains: str = "", use_cache: bool = False, debug: bool = False, date_from: str = "", date_to: str = "", congress: int = 0) -> str:
+    """
+    Answer a query from the selected domains.
+
+    date_from/date_to ("2025", "2025-03" or "2025-03-14") and congress (e.g. 118)
+    restrict bills, orders and opinions to matching documents. Filtered searches
+    skip the response cache, which is not keyed on filters.
+
+    When the client cancels the call (notifications/cancelled, sent when the
+    browser disconnects), the pipeline stops at its next checkpoint.
+    """
+    return await run_cancellable(run_search, query, k_bills, k_orders, k_opinions, domains, use_cache, debug, date_from, date_to, congress)
+
+
+async def run_cancellable(fn, *args):
+    """
+    Run a pipeline off the event loop. If the MCP request is cancelled, stop
+    waiting for it and cancel its token, so it stops at its next checkpoint.
+    """
+    with cancel_scope(CancelToken()) as token:
+        try:
+            return await anyio.to_thread.run_sync(fn, *args, abandon_on_cancel=True)
+        except anyio.get_cancelled_exc_class():
+            logging.info(f"{fn.__name__} cancelled by the client")
+            token.cancel()
+            raise
+
+
+def run_search(query, k_bills=5, k_orders=5, k_opinions=5, domains="", use_cache=False, debug=False, date_from="", date_to="", congress=0):
+    """
+    `search` with single-flight coalescing: a request identical to one already
+    in flight (same normalized query and parameters) waits for and shares that
+    result instead of running the pipeline again.
+    """
+    trace = start_trace()
+    debug = debug_enabled(debug)
+    filters = parse_filters(date_from, date_to, congress)
+    use_cache = use_cache and not filters
+    group = (k_bills, k_orders, k_opinions, domains, tuple(sorted((filters or {}).items())), use_cache, debug)
+
+    call, leader = coalescer.join((normalize_query(query),) + group, group)
+    if not leader:
+        with span("coalesce_wait", match="query"):
+            shared = coalescer.wait(call)
+        if shared is not None:
+            return shared
+        logging.warning("Coalesced search got no result from its leader, running it independently")
+        return answer_query(trace, query, k_bills, k_orders, k_opinions, domains, use_cache, debug, filters)
+
+    try:
+        result = answer_query(trace, query, k_bills, k_orders, k_opinions, domains, use_cache, debug, filters, call)
+    except BaseException as e:
+        coalescer.finish(call, error=e)
+        raise
+    coalescer.finish(call, result=result)
+    return result
+
+
+def normalize_query(query):
+    return " ".join(re.findall(r"[a-z0-9]+", query.lower()))
+
+
+def answer_query(trace, query, k_bills, k_orders, k_opinions, domains, use_cache, debug, filters, call=None):
+    with span("embedding"):
+        query_embedding = np.array(model.encode_query(query), dtype=np.float32).reshape(1,-1)
+        norm_qe = query_embedding/np.linalg.norm(query_embedding)
+    check_cancelled()
+
+    # Near-duplicate questions share an in-flight answer only when the caller
+    # already accepts semantically cached answers.
+    if call is not None and use_cache:
+        similar = coalescer.match(call, norm_qe)
+        if similar is not None:
+            with span("coalesce_wait", match="embedding"):
+                shared = coalescer.wait(similar)
+            if shared is not None:
+                return shared
+
+    # Routing is an LLM round trip; the FAISS/BM25 stage of local retrieval
+    # overlaps with it and the domains the router does not pick are dropped
+    # before any GraphRAG work is spent on them.
+    speculative = {}
+    if domains == "" and speculative_retrieval:
+        speculative = speculate(query, norm_qe, k_bills, k_orders, k_opinions, filters)
+    try:
+        domains = resolve_domains(query, domains)
+        check_cancelled()
+    except Cancelled:
+        collect_speculative(speculative, [])
+        raise
+    
+    if use_cache:
+        cached = cached_response(query_embedding, domains)
+        if cached:
+            collect_speculative(speculative, [])
+            if debug:
+                cached["thinking"]["trace"] = trace.summary()
+            return json.dumps(cached)
+    
+    prefetched = collect_speculative(speculative, domains)
+    context = retrieve(query, norm_qe, domains, k_bills, k_orders, k_opinions, filters, prefetched)
+    check_cancelled()
+    response_data = generate_answer(query, query_embedding, context, domains, use_cache)
+
+    with span("serialization"):
+        if debug:
+            response_data["thinking"]["trace"] = trace.summary()
+        return json.dumps(sanitize_for_json(response_data))
+
+
+def resolve_domains(query, domains=""):
     if domains != "":
-        domain_list = domains.split(",")
-    else:
+        return domains.split(",")
+
+    with span("routing"):
         raw_domains = choose_domain(query)
-        logging.info(f"Raw domains response: {raw_domains}")
-        
-        domain_list = []
+    logging.info(f"Raw domains response: {raw_domains}")
     
-        s_dom = str(raw_domains)
-        if "Congressional Bills" in s_dom: domain_list.append("Congressional Bills")
-        if "Executive Orders" in s_dom: domain_list.append("Executive Orders")
-        if "Supreme Court" in s_dom: domain_list.append("Supreme Court Decisions")
-        if "News" in s_dom: domain_list.append("News Articles")
-        
-        if not domain_list:
-            logging.warning("No domains matched, defaulting to empty.")
+    domain_list = []
+
+    s_dom = str(raw_domains)
+    if "Congressional Bills" in s_dom: domain_list.append("Congressional Bills")
+    if "Executive Orders" in s_dom: domain_list.append("Executive Orders")
+    if "Supreme Court" in s_dom: domain_list.append("Supreme Court Decisions")
+    if "News" in s_dom: domain_list.append("News Articles")
     
+    if not domain_list:
+        logging.warning("No domains matched, defaulting to empty.")
+
     logging.info(f"Final domain list: {domain_list}")
-    domains = domain_list
+    return domain_list
+
+
+def speculate(query, norm_qe, k_bills, k_orders, k_opinions, filters):
+    """
+    Start the FAISS/BM25 candidate search of every in-process domain before
+    routing has picked any. GraphRAG runs later, only for the domains picked;
+    remote domains are not searched until then.
+    """
+    k = {"Congressional Bills": k_bills, "Executive Orders": k_orders, "Supreme Court Decisions": k_opinions}
+    speculative = {}
+    for domain, client in domain_clients.items():
+        if isinstance(client, RemoteDomainClient):
+            continue
+        work = functools.partial(client.prefetch, [query], norm_qe, k[domain], filters)
+        speculative[domain] = (speculation_pool.submit(contextvars.copy_context().run, work), work)
+    return speculative
+
+
+def collect_speculative(speculative, domains):
+    """Prefetched candidates of `domains`, for `retrieve`; the other domains are cancelled or ignored."""
+    prefetched = {}
+    for domain, (future, work) in speculative.items():
+        if domain not in domains:
+            future.cancel()
+            continue
+        try:
+            # Still queued behind other requests' speculation, so run it here
+            prefetched[domain] = work() if future.cancel() else future.result()
+        except Exception as e:
+            logging.error(f"ERROR: Speculative retrieval for {domain} failed, searching again: {e}")
+    discarded = [d for d in speculative if d not in domains]
+    if discarded:
+        logging.info(f"Discarded speculative retrieval for {discarded}")
+    return prefetched
+
+
+def cached_response(query_embedding, domains):
+    with span("cache_lookup"):
+        answer, cached_query, similarity, cache_id = cache_hit(query_embedding)
+    if not answer:
+        return None
+    logging.info("Cache hit!")
+    return {
+        "answer": answer,
+        "cache_id": cache_id,
+        "thinking": {
+            "domains": domains,
+            "context": "Retrieved from cache.",
+            "cached": True
+        }
+    }
 
-    query_embedding = np.array(model.encode(f"search_query: {query}"), dtype=np.float32).reshape(1,-1)
-    norm_qe = query_embedding/np.linalg.norm(query_embedding)
-    
-    
-    if use_cache:
-        answer, cached_query, similarity = cache_hit(query_embedding)
-        if answer:
-            logging.info("Cache hit!")
-            return json.dumps({
-                "answer": answer,
-                "thinking": {
-                    "domains": domain_list,
-                    "context": "Retrieved from cache.",
-                    "cached": True
-                }
-            })
-    
+
+def search_domain(client, domain, query, norm_qe, k, filters, prefetched):
+    if domain in prefetched:
+        return client.search(query, norm_qe, k, filters, prefetched=prefetched[domain])
+    return client.search(query, norm_qe, k, filters)
+
+
+def retrieve(query, norm_qe, domains, k_bills=5, k_orders=5, k_opinions=5, filters=None, prefetched=None):
+    """Context from `domains`; `prefetched` holds candidates from `speculate` to finish instead of searching again."""
+    prefetched = prefetched or {}
+    context = []
     if "Congressional Bills" in domains:
         try:
             logging.info("Searching Congressional Bills...")
-            context.extend(bills.search_congressional_bills(query, norm_qe, k_bills))
+            with span("retrieval", domain="bills"):
+                context.extend(search_domain(bills, "Congressional Bills", query, norm_qe, k_bills, filters, prefetched))
         except Exception as e:
             logging.error(f"ERROR: Failed to search Congressional Bills: {e}")
 
+    check_cancelled()
     if "Executive Orders" in domains:
         try:
             logging.info("Searching Executive Orders...")
-            context.extend(orders.search_executive_orders(query, norm_qe, k_orders))
+            with span("retrieval", domain="orders"):
+                context.extend(search_domain(orders, "Executive Orders", query, norm_qe, k_orders, filters, prefetched))
         except Exception as e:
             logging.error(f"ERROR: Failed to search Executive Orders: {e}")
 
+    check_cancelled()
     if "Supreme Court Decisions" in domains:
         try:
             logging.info("Searching Supreme Court Decisions...")
-            context.extend(opinions.search_supreme_court_decisions(query, norm_qe, k_opinions))
+            with span("retrieval", domain="opinions"):
+                context.extend(search_domain(opinions, "Supreme Court Decisions", query, norm_qe, k_opinions, filters, prefetched))
         except Exception as e:
             logging.error(f"ERROR: Failed to search Supreme Court Decisions: {e}")
 
+    check_cancelled()
     if "News Articles" in domains:
         try:
             logging.info("Searching News Articles...")
-            context.extend(get_news_articles(query, norm_qe))
+            with span("retrieval", domain="news"):
+                context.extend(get_news_articles(query, norm_qe))
         except Exception as e:
             logging.error(f"ERROR: Failed to search News Articles: {e}")
-    
+    return context
+
+
+def generate_answer(query, query_embedding, context, domains, use_cache=False, record_history=True):
+    """Rank the retrieved context, generate, evaluate and verify an answer; returns the response dict."""
     logging.info("Sorting context...")
     context.sort(key=lambda item: item['metric'], reverse=True)
     
     logging.info("Selecting best context...")
     best_context = context[:5]
-    formatted_context = format_context(best_context)
+    with span("context_packing"):
+        formatted_context = format_context(best_context, query_embedding, context_budgets["search"])
 
     logging.info("Generating response...")
-    response = llm_client.chat(
-        f"""Answer the following query using the provided context. 
-        You MUST cite your sources using the format [1], [2], etc. corresponding to the numbered context items provided.
-        Do not include the full title in the text, just the bracketed number.
-
-        Query: {query}
-        Context: {formatted_context}
-        Answer:"""
-    )
-
+    with span("generation"):
+        response = llm_client.complete(
+            "generation",
+            f"""Answer the following query using the provided context. 
+            You MUST cite your sources using the format [1], [2], etc. corresponding to the numbered context items provided.
+            Do not include the full title in the text, just the bracketed number.
+
+            Query: {query}
+            Context: {formatted_context}
+            Answer:"""
+        )
+
+    check_cancelled()
     logging.info("Evaluating response...")
-    evaluator = Evaluator(query, query_embedding, best_context, formatted_context, response, model, llm_client)
-    response, evaluation = evaluator.evaluate()
-    context_history.extend(context)
-
-    if verify(query, query_embedding, best_context, formatted_context, response) or True: # Force true for now to ensure output
-        convo_history.append({
-            "query": query,
-            "previous_response": response
-        })
+    with span("evaluation"):
+        evaluator = Evaluator(query, query_embedding, best_context, formatted_context, response, model, llm_client)
+        response, evaluation = evaluator.evaluate()
+    check_cancelled()
+    if record_history:
+        context_history.extend(context)
+
+    with span("verify"):
+        verified = verify(query, query_embedding, best_context, formatted_context, response)
+
+    check_cancelled()
+    if verified or True: # Force true for now to ensure output
+        if record_history:
+            convo_history.append({
+                "query": query,
+                "previous_response": response
+            })
 
         final_response = response + evaluation
+        cache_id = None
         if use_cache:
-            logging.info("Saving response to cache...")
-            CacheDB(
-                    query=query,
-                    answer=final_response,
-                    embedding=query_embedding.flatten().tolist(),
-                    evaluation="neutral",
-                    feedback="",
-                ).save()
+            logging.info("Queueing response for the cache...")
+            with span("cache_save"):
+                cache_id = cache_writer.add(query, final_response, query_embedding.flatten())
 
         logging.info("Returning response...")
-        response_data = {
+        return {
             "answer": final_response,
+            "cache_id": cache_id,
             "sources": best_context,
             "thinking": {
                 "domains": domains,
@@ -163,21 +385,110 @@ def search(query: str, k_bills=5, k_orders=5, k_opinions=5, domains="", use_cach
                 "cached": False
             }
         }
-        return json.dumps(sanitize_for_json(response_data))
 
     else:
-        convo_history.append({
-            "query": query,
-            "previous_response": "context was not enough"
-        })
-        return json.dumps({
+        if record_history:
+            convo_history.append({
+                "query": query,
+                "previous_response": "context was not enough"
+            })
+        return {
             "answer": "I cannot respond to this query based on the provided context. Please try again or ask a different question.",
             "thinking": {
                 "domains": domains,
                 "context": formatted_context,
                 "cached": False
             }
-        })
+        }
+
+
+@mcp.tool()
+async def batch_search(queries: List[str], k_bills: int = 5, k_orders: int = 5, k_opinions: int = 5, domains: str = "", use_cache: bool = False, max_concurrency: int = 4, date_from: str = "", date_to: str = "", congress: int = 0, ctx: Context = None) -> str:
+    """
+    Answer many queries at once, e.g. to pre-warm the cache or run evaluation sets.
+
+    All queries are embedded in one batched pass and each local domain is
+    searched once with the full query matrix. Routing, news retrieval and
+    generation run with at most `max_concurrency` queries in flight, and each
+    result is streamed to the client as a log message when it completes.
+    Conversation history is left untouched. The date and congress filters
+    apply to every query, as in `search`.
+    """
+    total = len(queries)
+    filters = parse_filters(date_from, date_to, congress)
+    use_cache = use_cache and not filters
+    if total == 0:
+        return json.dumps([])
+    limiter = anyio.CapacityLimiter(max(1, max_concurrency))
+    results = [None] * total
+
+    def in_background(fn, *args):
+        # Batch LLM calls queue behind interactive requests
+        with llm_priority("background"):
+            return fn(*args)
+
+    async def run_bounded(fn, *args):
+        return await anyio.to_thread.run_sync(in_background, fn, *args, limiter=limiter)
+
+    with span("embedding", queries=total):
+        embeddings = await anyio.to_thread.run_sync(
+            lambda: np.array(model.encode_query(queries), dtype=np.float32).reshape(total, -1)
+        )
+        norm_embeddings = np.ascontiguousarray(embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True))
+
+    domain_lists = [None] * total
+    async def route(i):
+        domain_lists[i] = await run_bounded(resolve_domains, queries[i], domains)
+    async with anyio.create_task_group() as tg:
+        for i in range(total):
+            tg.start_soon(route, i)
+
+    pending = []
+    for i in range(total):
+        if use_cache:
+            cached = await anyio.to_thread.run_sync(cached_response, embeddings[i:i+1], domain_lists[i])
+            if cached:
+                results[i] = cached
+                continue
+        pending.append(i)
+
+    contexts = {i: [] for i in pending}
+    for domain, client, k in (("Congressional Bills", bills, k_bills), ("Executive Orders", orders, k_orders), ("Supreme Court Decisions", opinions, k_opinions)):
+        rows = [i for i in pending if domain in domain_lists[i]]
+        if not rows:
+            continue
+        try:
+            logging.info(f"Batch searching {domain} for {len(rows)} queries...")
+            with span("retrieval", domain=client.name, queries=len(rows)):
+                found = await anyio.to_thread.run_sync(client.batch_search, [queries[i] for i in rows], norm_embeddings[rows], k, filters)
+            for i, context in zip(rows, found):
+                contexts[i].extend(context)
+        except Exception as e:
+            logging.error(f"ERROR: Failed to batch search {domain}: {e}")
+
+    completed = 0
+    async def answer(i):
+        nonlocal completed
+        if "News Articles" in domain_lists[i]:
+            try:
+                contexts[i].extend(await run_bounded(get_news_articles, queries[i], norm_embeddings[i:i+1]))
+            except Exception as e:
+                logging.error(f"ERROR: Failed to search News Articles: {e}")
+        try:
+            results[i] = await run_bounded(generate_answer, queries[i], embeddings[i:i+1], contexts[i], domain_lists[i], use_cache, False)
+        except Exception as e:
+            logging.error(f"ERROR: Failed to answer batch query {i}: {e}")
+            results[i] = {"error": str(e)}
+        completed += 1
+        if ctx is not None:
+            await ctx.info(json.dumps(sanitize_for_json({"index": i, "query": queries[i], **results[i]})))
+            await ctx.report_progress(completed, total, message=queries[i])
+
+    async with anyio.create_task_group() as tg:
+        for i in pending:
+            tg.start_soon(answer, i)
+
+    return json.dumps(sanitize_for_json([{"index": i, "query": q, **r} for i, (q, r) in enumerate(zip(queries, results))]))
     
 
 def sanitize_for_json(obj):
@@ -201,8 +512,8 @@ def sanitize_for_json(obj):
 
 @mcp.tool()
 def choose_domain(query: str):
-    response = llm_client.chat(
-        f"""Choose what domain this query can best be answered by:
+    try:
+        return llm_client.complete("choose_domain", f"""Choose what domain this query can best be answered by:
         1. Congressional Bills
         2. Executive Orders
         3. Supreme Court Decisions
@@ -214,22 +525,21 @@ def choose_domain(query: str):
 
         Query: {query}
         Answer:
-        """
-    )
-    
-    try:
-        if isinstance(response, str):
-            start = response.find('[')
-            end = response.rfind(']') + 1
-            if start != -1 and end != -1:
-                return ast.literal_eval(response[start:end])
-            return ast.literal_eval(response)
-        return response
-    except:
-        logging.error(f"Failed to parse domain response: {response}")
+        """, parse=parse_domains)
+    except Exception as e:
+        logging.error(f"Failed to parse domain response: {e}")
         return []
 
 
+def parse_domains(response):
+    start = response.find('[')
+    end = response.rfind(']') + 1
+    domains = ast.literal_eval(response[start:end] if start != -1 and end > start else response)
+    if not isinstance(domains, list) or not all(isinstance(d, str) for d in domains):
+        raise ValueError(f"Expected a list of domain names, got {response[:100]!r}")
+    return domains
+
+
 @mcp.tool()
 def get_news_articles(query: str, query_embedding):
     news = NewsClient(query, query_embedding, llm_client)
@@ -294,9 +604,9 @@ def verify(query, query_embedding, documents, formatted_context, response):
         vector_guardrail_1 = documents[0]["metric"] >= 0.5
     except:
         vector_guardrail_1 = False
-    vector_guardrail_2 = cosine_similarity(query_embedding, np.array(model.encode(response), dtype=np.float32)) <= 0.5
-    llm_guardrail = "true" in llm_client.chat(
-        f"""Is the response generated based in context and answering the question? Only say 'true' or 'false'.
+    vector_guardrail_2 = cosine_similarity(query_embedding, np.array(model.encode_document(response), dtype=np.float32)) <= 0.5
+    try:
+        llm_guardrail = llm_client.complete("verify", f"""Is the response generated based in context and answering the question? Only say 'true' or 'false'.
         
         If you say "true" that means that the response is based in context and is answering the question.
         If you say "false" that means that the response is not based in context or not answering the question.
@@ -306,8 +616,9 @@ def verify(query, query_embedding, documents, formatted_context, response):
         Response: {response}
 
         Answer:
-        """
-    )
+        """, parse=parse_true_false)
+    except ValueError:
+        llm_guardrail = False
 
     logging.info(f"guardrail 1: {vector_guardrail_1}, 2: {vector_guardrail_2}, deepseek: {llm_guardrail}")
 
@@ -318,7 +629,11 @@ def verify(query, query_embedding, documents, formatted_context, response):
     else:
         return False
 
-def format_context(context: List[dict]) -> str:
+def format_context(context: List[dict], query_embedding=None, budget=None) -> str:
+    """
+    Number the context items for citation. With a token `budget`, source texts
+    are trimmed to their sentences most relevant to `query_embedding`.
+    """
     formatted_context = []
     
     for i, item in enumerate(context, 1):
@@ -337,7 +652,7 @@ def format_context(context: List[dict]) -> str:
             entry = f"{prefix}Congressional Bill: {title} ({congress}th Congress, H.R. {number})\n" \
                     f"Date: {action_date}\n" \
                     f"Latest Action: {action_text}"
-            formatted_context.append(entry)
+            formatted_context.append((entry, ""))
             
         # Executive Order
         elif 'order_number' in chunk and 'signing_date' in chunk:
@@ -347,8 +662,8 @@ def format_context(context: List[dict]) -> str:
             text = chunk_text_obj.get('text', '') if isinstance(chunk_text_obj, dict) else str(chunk_text_obj)
             
             entry = f"{prefix}Executive Order: {title} ({date})\n" \
-                    f"Text: {text}"
-            formatted_context.append(entry)
+                    f"Text: "
+            formatted_context.append((entry, text))
             
         # Supreme Court Opinion
         elif 'resource_uri' in chunk and 'text' in chunk:
@@ -358,8 +673,8 @@ def format_context(context: List[dict]) -> str:
             
             entry = f"{prefix}Supreme Court Decision ({date})\n" \
                     f"URL: {url}\n" \
-                    f"Text: {text}"
-            formatted_context.append(entry)
+                    f"Text: "
+            formatted_context.append((entry, text))
             
         # News Article
         elif 'body' in chunk and 'title' in chunk:
@@ -368,69 +683,126 @@ def format_context(context: List[dict]) -> str:
             date = chunk.get('date', 'Unknown Date') # Assuming date field exists, defaulting if not
             
             entry = f"{prefix}News Article: {title} ({date})\n" \
-                    f"Content: {body}"
-            formatted_context.append(entry)
+                    f"Content: "
+            formatted_context.append((entry, body))
             
         else:
             # Fallback for unknown types
-            formatted_context.append(f"{prefix}Unknown Source: {str(chunk)}")
+            formatted_context.append((f"{prefix}Unknown Source: ", str(chunk)))
             
-    return "\n\n".join(formatted_context)
+    return packer.pack(formatted_context, query_embedding, budget)
 
 @mcp.tool()
-def follow_up(query: str, k_bills: int, k_orders: int, k_opinions: int, domains = "", use_cache: bool = False):
-    query_embedding = np.array(model.encode(query), dtype=np.float32)
-    current = context_history.copy()
-    for context in current:
-        context["similarity"] = cosine_similarity(np.array(context["chunk"]["embedding"], dtype=np.float32), query_embedding)
-    
-    current.sort(key=lambda item: item['similarity'], reverse=False)
-    relevant_context = current[:5]
-    formatted_context = format_context(relevant_context)
-
-    llm_check = llm_client.chat(f"""
-    Read the query and say "true" or "false" if there is sufficient context to answer it.
-    Query: {query}
-    Context: {formatted_context}
+async def follow_up(query: str, k_bills: int, k_orders: int, k_opinions: int, domains = "", use_cache: bool = False, debug: bool = False):
+    return await run_cancellable(run_follow_up, query, k_bills, k_orders, k_opinions, domains, use_cache, debug)
 
-    Answer:
-    """)
 
-    if "true" in llm_check or relevant_context[0]["similarity"] < 0.5:
-        response = llm_client.chat(f"""
-        Answer a follow up question based in context and conversation history. 
-        You MUST cite your sources using the format [1], [2], etc.
+def run_follow_up(query, k_bills, k_orders, k_opinions, domains="", use_cache=False, debug=False):
+    trace = start_trace()
+    debug = debug_enabled(debug)
+    with span("embedding"):
+        query_embedding = np.array(model.encode_query(query), dtype=np.float32)
+    current = context_history.copy()
+    with span("history_ranking", contexts=len(current)):
+        for context in current:
+            context["similarity"] = cosine_similarity(np.array(context["chunk"]["embedding"], dtype=np.float32), query_embedding)
         
-        Follow-up question: {query}
-        Context: {formatted_context}
-        Conversation History: {convo_history}
+        current.sort(key=lambda item: item['similarity'], reverse=False)
+    relevant_context = current[:5]
+    with span("context_packing"):
+        formatted_context = format_context(relevant_context, query_embedding, context_budgets["follow_up"])
 
-        Answer:
-        """)
+    with span("sufficiency_check"):
+        try:
+            sufficient = llm_client.complete("sufficiency_check", f"""
+            Read the query and say "true" or "false" if there is sufficient context to answer it.
+            Query: {query}
+            Context: {formatted_context}
+
+            Answer:
+            """, parse=parse_true_false)
+        except ValueError:
+            sufficient = False
+    check_cancelled()
+
+    if sufficient or relevant_context[0]["similarity"] < 0.5:
+        with span("generation"):
+            response = llm_client.complete("follow_up", f"""
+            Answer a follow up question based in context and conversation history. 
+            You MUST cite your sources using the format [1], [2], etc.
+            
+            Follow-up question: {query}
+            Context: {formatted_context}
+            Conversation History: {convo_history.render()}
+
+            Answer:
+            """)
         convo_history.append({
             "query": query,
             "previous_response": response
         })
 
-        return json.dumps(sanitize_for_json({
-            "answer": response,
-            "sources": relevant_context,
-            "thinking": {
-                "domains": ["Conversation History"],
-                "context": formatted_context,
-                "cached": False
-            }
-        }))
+        thinking = {
+            "domains": ["Conversation History"],
+            "context": formatted_context,
+            "cached": False
+        }
+        with span("serialization"):
+            if debug:
+                thinking["trace"] = trace.summary()
+            return json.dumps(sanitize_for_json({
+                "answer": response,
+                "sources": relevant_context,
+                "thinking": thinking
+            }))
     else:
-        return search(query, k_bills, k_orders, k_opinions, domains, use_cache=use_cache)
+        return run_search(query, k_bills, k_orders, k_opinions, domains, use_cache=use_cache, debug=debug)
 
 @mcp.tool()
-def update_user_evaluation(query, response, evaluation: str):
-    CacheDB.objects(query=query, answer=response).update(evaluation=evaluation)
+async def ingest(domain: str, chunks: List[dict], merge: bool = False) -> str:
+    """
+    Add chunks to a running corpus ("bills", "orders", "opinions" or the domain name).
+
+    Chunks use the same shape as the corpus JSON. They are embedded, added to a
+    delta index searched alongside the main one and merged into the knowledge
+    graph; searches keep using the previous snapshot until the new one is swapped
+    in. `merge` folds the delta into the main index and writes it back to src/assets.
+    """
+    client = domain_clients.get(domain) or next((c for c in domain_clients.values() if c.name == domain), None)
+    if client is None:
+        raise ValueError(f"Unknown domain: {domain}")
+    if isinstance(client, RemoteDomainClient):
+        raise ValueError(f"{client.name} is served by retrieval services and cannot be ingested into from here")
+    if not chunks:
+        return json.dumps({"domain": client.name, "ingested": 0, "version": client.version})
+
+    def run():
+        with span("ingest", domain=client.name, chunks=len(chunks)):
+            embeddings = np.array(model.encode_document([chunk_text(c) for c in chunks]), dtype=np.float32)
+            embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+            version = client.ingest(chunks, embeddings)
+            if merge:
+                version = client.merge(persist=True)
+        return version
+
+    version = await anyio.to_thread.run_sync(run)
+    return json.dumps({"domain": client.name, "ingested": len(chunks), "version": version})
 
 @mcp.tool()
-def update_user_feedback(query, response, feedback: str):
-    CacheDB.objects(query=query, answer=response).update(feedback=feedback)
+def update_user_evaluation(query, response, evaluation: str, cache_id: str = ""):
+    if cache_id:
+        cache_writer.update(cache_id, evaluation=evaluation)
+    else:
+        cache_writer.validate(evaluation=evaluation)
+        CacheDB.objects(query=query, answer=response).update(evaluation=evaluation)
+
+@mcp.tool()
+def update_user_feedback(query, response, feedback: str, cache_id: str = ""):
+    if cache_id:
+        cache_writer.update(cache_id, feedback=feedback)
+    else:
+        cache_writer.validate(feedback=feedback)
+        CacheDB.objects(query=query, answer=response).update(feedback=feedback)
 
 
 @mcp.tool()
@@ -438,7 +810,28 @@ def clean_history():
     context_history.clear()
     convo_history.clear()
 
+@mcp.tool()
+def metrics() -> str:
+    """Prometheus text exposition of the per-stage and LLM token metrics."""
+    return export_metrics()
+
+@mcp.tool()
+async def profile(seconds: float = 10, interval_ms: float = 0, top: int = 20, output: str = "speedscope", include_idle: bool = False, memory: bool = True) -> str:
+    """
+    Sample every thread's stack for `seconds` (capped at PROFILE_MAX_SECONDS)
+    and return a speedscope or collapsed-stack profile, the `top` hottest
+    functions and, with `memory`, a tracemalloc snapshot. Admin only; the web
+    server exposes it at POST /api/admin/profile.
+    """
+    seconds = min(max(seconds, 0.1), float(os.getenv("PROFILE_MAX_SECONDS", 120)))
+    result = await anyio.to_thread.run_sync(Profiler.capture, seconds, interval_ms or None, top, output, include_idle, memory)
+    logging.info(f"Captured a {result['seconds']}s profile with {result['samples']} samples")
+    return json.dumps(result)
+
 if __name__ == "__main__":
     logging.info("Starting MCP server...")
+    start_metrics_server()
+    # Exit through atexit on SIGTERM so queued cache writes are flushed
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
     # print("Starting MCP server...")
     mcp.run(transport="stdio")
\ No newline at end of file
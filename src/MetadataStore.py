@@ -0,0 +1,146 @@
+import calendar
+import datetime
+import os
+import numpy as np
+import faiss
+
+MISSING = -1
+
+class MetadataStore:
+    """
+    Column store of filterable chunk metadata, one row per chunk id.
+
+    Columns are int32 numpy arrays:
+        date     - YYYYMMDD from latestAction.actionDate (bills), signing_date
+                   (orders) or date_filed/date_created (opinions)
+        congress - congress number (bills only)
+
+    Filters become a bitmap over chunk ids that FAISS applies inside the search
+    through an IDSelectorBitmap, so a filtered query scans the same vectors as an
+    unfiltered one instead of over-fetching and discarding.
+    """
+
+    def __init__(self, date, congress):
+        self.date = date
+        self.congress = congress
+        self.bitmaps = {}
+
+    @classmethod
+    def from_chunks(cls, chunks):
+        date = np.full(len(chunks), MISSING, dtype=np.int32)
+        congress = np.full(len(chunks), MISSING, dtype=np.int32)
+        for i, chunk in enumerate(chunks):
+            date[i] = parse_date(chunk_date(chunk))
+            try:
+                congress[i] = int(chunk.get("congress", MISSING))
+            except (TypeError, ValueError):
+                pass
+        return cls(date, congress)
+
+    @classmethod
+    def load(cls, path, chunks):
+        """Read the columns written by scripts/build_index.py, or derive them from the chunks."""
+        if os.path.exists(path):
+            columns = np.load(path)
+            if len(columns["date"]) == len(chunks):
+                return cls(columns["date"], columns["congress"])
+        return cls.from_chunks(chunks)
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            np.savez(f, date=self.date, congress=self.congress)
+
+    def extend(self, chunks):
+        """New store with rows for freshly ingested chunks appended."""
+        added = MetadataStore.from_chunks(chunks)
+        return MetadataStore(np.concatenate([self.date, added.date]), np.concatenate([self.congress, added.congress]))
+
+    def mask(self, filters):
+        mask = np.ones(len(self.date), dtype=bool)
+        date_from, date_to = filters.get("date_from"), filters.get("date_to")
+        congress = filters.get("congress")
+
+        if congress:
+            if np.any(self.congress != MISSING):
+                mask &= self.congress == congress
+            else:
+                # Corpora without a congress column are filtered to that congress's term
+                start, end = congress_term(congress)
+                date_from = max(date_from or start, start)
+                date_to = min(date_to or end, end)
+        if date_from:
+            mask &= (self.date != MISSING) & (self.date >= date_from)
+        if date_to:
+            mask &= (self.date != MISSING) & (self.date <= date_to)
+        return mask
+
+    def selector(self, filters):
+        """
+        FAISS search parameters restricting results to rows matching `filters`.
+
+        Returns (params, bitmap); the caller keeps `bitmap` alive for the search.
+        Bitmaps are cached per filter, and a store is replaced rather than
+        mutated on ingestion, so the cache never goes stale.
+        """
+        key = tuple(sorted(filters.items()))
+        bitmap = self.bitmaps.get(key)
+        if bitmap is None:
+            bitmap = np.packbits(self.mask(filters), bitorder="little")
+            if len(self.bitmaps) > 256:
+                self.bitmaps.clear()
+            self.bitmaps[key] = bitmap
+        return faiss.SearchParameters(sel=faiss.IDSelectorBitmap(bitmap)), bitmap
+
+
+def chunk_date(chunk):
+    latest_action = chunk.get("latestAction")
+    if isinstance(latest_action, dict) and latest_action.get("actionDate"):
+        return latest_action["actionDate"]
+    return chunk.get("signing_date") or chunk.get("date_filed") or chunk.get("date_created") or chunk.get("date")
+
+
+def parse_date(value, end=False):
+    """
+    "2025", "2025-03" or "2025-03-14[T...]" as an int YYYYMMDD.
+
+    Partial dates resolve to the start of the period, or its end when `end` is set.
+    """
+    if not value:
+        return MISSING
+    parts = str(value)[:10].split("-")
+    try:
+        year = int(parts[0])
+        month = int(parts[1]) if len(parts) > 1 else (12 if end else 1)
+        if len(parts) > 2:
+            day = int(parts[2])
+        else:
+            day = calendar.monthrange(year, month)[1] if end else 1
+        datetime.date(year, month, day)
+    except (ValueError, IndexError):
+        return MISSING
+    return year * 10000 + month * 100 + day
+
+
+def congress_term(congress):
+    """First and last day of a congress; terms start on January 3rd of odd years."""
+    start_year = 1789 + 2 * (congress - 1)
+    return start_year * 10000 + 103, (start_year + 2) * 10000 + 102
+
+
+def parse_filters(date_from="", date_to="", congress=0):
+    """
+    Tool arguments to a filter dict, or None when nothing is filtered.
+
+    Raises ValueError for a date that cannot be parsed rather than searching
+    without it.
+    """
+    filters = {}
+    for name, value, end in (("date_from", date_from, False), ("date_to", date_to, True)):
+        if not value:
+            continue
+        filters[name] = parse_date(value, end=end)
+        if filters[name] == MISSING:
+            raise ValueError(f"Invalid {name} {value!r}, expected YYYY, YYYY-MM or YYYY-MM-DD")
+    if congress:
+        filters["congress"] = int(congress)
+    return filters or None
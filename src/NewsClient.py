@@ -4,6 +4,7 @@ from typing import List, Dict, Optional
 from dotenv import load_dotenv
 from LLMClient import GroqClient
 from util import cosine_similarity
+from Telemetry import span
 import numpy as np
 
 load_dotenv()
@@ -36,18 +37,22 @@ class NewsClient:
         Example Query: "Who won the best actor Oscar in 2023?"
         Example Output: best actor Oscar 2023
         """
-        output = self.llm_client.chat(
+        self.multi_queries = self.llm_client.complete(
+            "news_keywords",
             messages=[
                 {"role": "system", "content": "You are an expert in breaking down queries into search terms."},
                 {"role": "user", "content": prompt}
-            ]
+            ],
+            parse=self.parse_keywords,
         )
-        
-        self.multi_queries = output.split('\n')
-        if len(self.multi_queries) > 3:
-            self.multi_queries = self.multi_queries[:3]
-            
         return self.multi_queries
+
+    @staticmethod
+    def parse_keywords(output):
+        queries = [line.strip() for line in output.split('\n') if line.strip()]
+        if not queries:
+            raise ValueError("No keyword queries in the reply")
+        return queries[:3]
     
     def search_articles(
         self, 
@@ -74,11 +79,12 @@ class NewsClient:
             payload["lang"] = lang
         
         try:
-            response = requests.post(
-                self.search_endpoint,
-                json=payload,
-                headers={"Content-Type": "application/json"}
-            )
+            with span("news_api"):
+                response = requests.post(
+                    self.search_endpoint,
+                    json=payload,
+                    headers={"Content-Type": "application/json"}
+                )
             
             response.raise_for_status()
             
@@ -105,18 +111,21 @@ class NewsClient:
         """Set sentence chunking for articles."""
         text = article.get("body", "")
         sentences = text.split(". ")
-        chunks = []
+        chunk_texts = []
         for i in range(0, len(sentences), sentences_per_chunk):
             chunk_sentences = sentences[i:i + sentences_per_chunk]
             chunk_text = ". ".join(chunk_sentences)
             
             if chunk_text and not chunk_text.endswith("."):
                 chunk_text += "."
-            
+            chunk_texts.append(chunk_text)
+
+        chunks = []
+        for chunk_text, embedding in zip(chunk_texts, model.encode_document(chunk_texts)):
             chunk_dict = article.copy()
             
             chunk_dict["body"] = chunk_text
-            chunk_dict["embedding"] = model.encode(chunk_text)
+            chunk_dict["embedding"] = embedding
 
             chunks.append({
                 "chunk": chunk_dict,
@@ -1,23 +1,8 @@
-import faiss
-import json
-from GraphRAG import GraphRAG
+from DomainClient import DomainClient
 
-class OpinionClient:
-    def __init__(self):
-        self.index = faiss.read_index("src/assets/opinions.index")
-        with open("src/assets/opinions.json", "r") as f:
-            self.chunks = json.load(f)
+class OpinionClient(DomainClient):
+    def __init__(self, dim=None):
+        super().__init__("opinions", dim)
 
-    def search_supreme_court_decisions(self, query, query_embedding, k=5):
-        D, I = self.index.search(query_embedding, k=k)
-
-        context = []
-        for d, i in zip(D[0], I[0]):
-            context.append({
-                "chunk": self.chunks[i],
-                "distance": float(1-d)
-            })
-        context.sort(key=lambda x: x["distance"], reverse=True)
-        
-        graph_rag = GraphRAG("src/assets/opinions_knowledge_graph.gexf", query)
-        return graph_rag.filter_entities(context)
\ No newline at end of file
+    def search_supreme_court_decisions(self, query, query_embedding, k=5, filters=None):
+        return self.search(query, query_embedding, k, filters)
@@ -0,0 +1,275 @@
+import os
+import sys
+import time
+import resource
+import sysconfig
+import threading
+import tracemalloc
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+STDLIB_DIR = sysconfig.get_paths()["stdlib"]
+
+# Leaf frames of threads parked on a queue, lock, selector or sleep (time.sleep
+# is native, so the function calling it is the leaf)
+BLOCKING_LEAVES = {
+    ("wait", "threading.py"),
+    ("_wait_for_tstate_lock", "threading.py"),
+    ("get", "queue.py"),
+    ("select", "selectors.py"),
+    ("_worker", "thread.py"),
+    ("accept", "socket.py"),
+    ("_run", "periodic_executor.py"),
+}
+
+class SamplingProfiler:
+    """
+    Wall-clock sampling profiler for every thread in the process.
+
+    Every `interval` seconds the calling thread reads all other Python stacks with
+    sys._current_frames(). Time inside native code (FAISS, torch, a `requests`
+    socket read) is charged to the Python frame that made the call. Idle
+    threads are skipped unless `include_idle` is set: those parked in a
+    blocking wait from a thread's own loop (a pool worker, the cache writer,
+    a batcher waiting for work, the event loop's selector). A request blocked
+    deeper in the pipeline, e.g. queued in the LLM scheduler, is still
+    counted. The profiled code does not run any extra work, so
+    overhead is one stack walk per thread per interval.
+    """
+
+    _running = threading.Lock()
+
+    def __init__(self, interval=None, include_idle=False):
+        self.interval = float(interval or os.getenv("PROFILE_INTERVAL_MS", 10)) / 1000
+        self.include_idle = include_idle
+        self.frames = []
+        self.frame_ids = {}
+        self.in_src = []
+        self.samples = {}
+        self.ticks = 0
+        self.duration = 0.0
+
+    def run(self, seconds):
+        if not SamplingProfiler._running.acquire(blocking=False):
+            raise RuntimeError("A profile is already being captured")
+        try:
+            me = threading.get_ident()
+            start = time.perf_counter()
+            last = start - self.interval
+            while True:
+                now = time.perf_counter()
+                if now - start >= seconds:
+                    break
+                names = {t.ident: t.name for t in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident == me:
+                        continue
+                    stack = self.stack(frame)
+                    if not self.include_idle and self.idle(stack):
+                        continue
+                    self.samples.setdefault(names.get(ident, str(ident)), []).append((stack, now - last))
+                frame = None
+                self.ticks += 1
+                last = now
+                time.sleep(max(0.0, self.interval - (time.perf_counter() - now)))
+            self.duration = time.perf_counter() - start
+        finally:
+            SamplingProfiler._running.release()
+        return self
+
+    def stack(self, frame):
+        """Frame ids of `frame`'s stack, outermost first."""
+        ids = []
+        while frame is not None:
+            code = frame.f_code
+            key = (code.co_name, code.co_filename, code.co_firstlineno)
+            if key not in self.frame_ids:
+                self.frame_ids[key] = len(self.frames)
+                self.frames.append(key)
+                self.in_src.append(in_src(code.co_filename))
+            ids.append(self.frame_ids[key])
+            frame = frame.f_back
+        return tuple(reversed(ids))
+
+    def idle(self, stack):
+        if not stack:
+            return True
+        name, filename, _ = self.frames[stack[-1]]
+        if (name, os.path.basename(filename)) not in BLOCKING_LEAVES:
+            return False
+        # A request thread has the pipeline's frames above its wait; a
+        # background loop has at most its own run method
+        return sum(self.in_src[i] for i in stack) <= 1
+
+    def label(self, i):
+        name, filename, line = self.frames[i]
+        return f"{name} ({short_path(filename)}:{line})"
+
+    def collapsed(self):
+        """Brendan Gregg's collapsed-stack format, one `thread;outer;...;leaf count` line per stack."""
+        counts = {}
+        for thread, samples in self.samples.items():
+            for stack, _ in samples:
+                key = ";".join([thread] + [self.label(i).replace(";", ":") for i in stack])
+                counts[key] = counts.get(key, 0) + 1
+        return "\n".join(f"{key} {count}" for key, count in sorted(counts.items()))
+
+    def speedscope(self):
+        """A speedscope.app file with one sampled profile per thread."""
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": f"MCPServer {self.duration:.1f}s",
+            "exporter": "legalai-profiler",
+            "activeProfileIndex": 0,
+            "shared": {"frames": [{"name": name, "file": filename, "line": line} for name, filename, line in self.frames]},
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": thread,
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": sum(weight for _, weight in samples),
+                    "samples": [list(stack) for stack, _ in samples],
+                    "weights": [weight for _, weight in samples],
+                }
+                for thread, samples in sorted(self.samples.items(), key=lambda item: -len(item[1]))
+            ],
+        }
+
+    def top(self, n=20):
+        """Hottest functions by samples where they were the leaf (self) and anywhere on the stack (total)."""
+        own, total, count = {}, {}, 0
+        for samples in self.samples.values():
+            for stack, _ in samples:
+                count += 1
+                if stack:
+                    own[stack[-1]] = own.get(stack[-1], 0) + 1
+                for i in set(stack):
+                    total[i] = total.get(i, 0) + 1
+        hot = sorted(total, key=lambda i: (own.get(i, 0), total[i]), reverse=True)[:n]
+        return [
+            {
+                "function": self.label(i),
+                "self": own.get(i, 0),
+                "total": total[i],
+                "self_pct": round(100 * own.get(i, 0) / count, 1),
+                "total_pct": round(100 * total[i] / count, 1),
+            }
+            for i in hot
+        ]
+
+
+def in_src(filename):
+    return os.path.abspath(filename).startswith(SRC_DIR + os.sep)
+
+
+def short_path(filename):
+    """Path relative to src/ or the package directory, for readable labels."""
+    path = os.path.abspath(filename)
+    if path.startswith(SRC_DIR + os.sep):
+        return os.path.relpath(path, SRC_DIR)
+    parts = path.split(os.sep)
+    for marker in ("site-packages", "dist-packages"):
+        if marker in parts:
+            return os.sep.join(parts[parts.index(marker) + 1:])
+    if path.startswith(STDLIB_DIR + os.sep):
+        return os.path.relpath(path, STDLIB_DIR)
+    return filename
+
+
+def module_name(filename):
+    """Top-level package (or src/ module) a file belongs to."""
+    short = short_path(filename)
+    if short == filename:
+        return filename
+    return os.path.splitext(short.split(os.sep)[0])[0]
+
+
+def rss_mb():
+    """Current resident set size, or the peak where /proc is unavailable."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def memory_snapshot(top=20):
+    """
+    Live traced allocations grouped by the module that allocated them and by
+    the innermost src/ module on the allocation's stack (so a corpus parsed by
+    json.load counts under DomainClient). The second grouping needs more than
+    one traced frame (LEGALAI_TRACEMALLOC=25). tracemalloc only sees the Python
+    and numpy allocators, not FAISS or torch's native buffers, which show up in
+    RSS only.
+    """
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+    ))
+    modules, callers = {}, {}
+    for stat in snapshot.statistics("traceback"):
+        frames = list(reversed(stat.traceback))
+        for groups, name in (
+            (modules, module_name(frames[0].filename)),
+            (callers, next((module_name(f.filename) for f in frames if in_src(f.filename)), "(outside src)")),
+        ):
+            size, count = groups.get(name, (0, 0))
+            groups[name] = (size + stat.size, count + stat.count)
+
+    def ranked(groups):
+        return [
+            {"module": name, "mb": round(size / 2**20, 2), "blocks": count}
+            for name, (size, count) in sorted(groups.items(), key=lambda item: -item[1][0])[:top]
+        ]
+
+    current, peak = tracemalloc.get_traced_memory()
+    return {
+        "rss_mb": rss_mb(),
+        "traced_mb": round(current / 2**20, 1),
+        "traced_peak_mb": round(peak / 2**20, 1),
+        "traceback_frames": tracemalloc.get_traceback_limit(),
+        "by_module": ranked(modules),
+        "by_caller": ranked(callers) if tracemalloc.get_traceback_limit() > 1 else [],
+        "lines": [
+            {"line": f"{short_path(stat.traceback[0].filename)}:{stat.traceback[0].lineno}", "mb": round(stat.size / 2**20, 2), "blocks": stat.count}
+            for stat in snapshot.statistics("lineno")[:top]
+        ],
+    }
+
+
+def capture(seconds, interval_ms=None, top=20, output="speedscope", include_idle=False, memory=True):
+    """
+    Profile the process for `seconds` and return the profile, a top-`top`
+    summary and, with `memory`, a tracemalloc snapshot. Tracing started at
+    import (LEGALAI_TRACEMALLOC) covers everything loaded since startup.
+    Otherwise tracing runs only for this capture and sees what was allocated
+    during it.
+    """
+    if output not in ("speedscope", "collapsed"):
+        raise ValueError(f"Unknown profile output {output!r}, expected 'speedscope' or 'collapsed'")
+    started_tracing = memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    try:
+        profiler = SamplingProfiler(interval_ms, include_idle).run(seconds)
+        result = {
+            "seconds": round(profiler.duration, 2),
+            "interval_ms": profiler.interval * 1000,
+            "ticks": profiler.ticks,
+            "samples": sum(len(s) for s in profiler.samples.values()),
+            "threads": {thread: len(samples) for thread, samples in profiler.samples.items()},
+            "top": profiler.top(top),
+            "format": output,
+            "profile": profiler.speedscope() if output == "speedscope" else profiler.collapsed(),
+        }
+        if memory:
+            result["memory"] = memory_snapshot(top)
+            result["memory"]["tracing_since"] = "profile start" if started_tracing else "startup"
+        return result
+    finally:
+        if started_tracing:
+            tracemalloc.stop()
@@ -0,0 +1,77 @@
+import os
+import logging
+import requests
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, wait
+from GraphRAG import GraphRAG
+from Telemetry import span
+
+def parse_services(value):
+    """
+    RETRIEVAL_SERVICES to {domain: [shard urls]}, e.g.
+    "bills=http://127.0.0.1:8101;opinions=http://127.0.0.1:8103,http://127.0.0.1:8104".
+    """
+    services = {}
+    for entry in filter(None, (e.strip() for e in (value or "").split(";"))):
+        name, _, urls = entry.partition("=")
+        urls = [u.strip().rstrip("/") for u in urls.split(",") if u.strip()]
+        if not urls:
+            raise ValueError(f"No service urls for {name!r} in RETRIEVAL_SERVICES")
+        services[name.strip()] = urls
+    return services
+
+class RemoteDomainClient:
+    """
+    A corpus served by RetrievalService processes, one per index shard.
+
+    Each search goes to every shard in parallel. A shard that errors or has
+    not answered within RETRIEVAL_TIMEOUT seconds is left out and the results
+    are partial (logged, and counted on the `scatter` span). The shards return
+    GraphRAG-tagged hits. Their union is cut to the k most similar and scored
+    once, as a single in-process index would be.
+    """
+
+    def __init__(self, name, urls, timeout=None):
+        self.name = name
+        self.urls = urls
+        self.timeout = float(timeout or os.getenv("RETRIEVAL_TIMEOUT", 5))
+        self.pool = ThreadPoolExecutor(max_workers=4 * len(urls), thread_name_prefix=f"{name}-scatter")
+
+    def search(self, query, query_embedding, k=5, filters=None):
+        return self.batch_search([query], query_embedding, k, filters)[0]
+
+    def batch_search(self, queries, query_embeddings, k=5, filters=None):
+        payload = {
+            "queries": list(queries),
+            "embeddings": np.asarray(query_embeddings, dtype=np.float32).reshape(len(queries), -1).tolist(),
+            "k": k,
+            "filters": filters,
+        }
+        with span("scatter", domain=self.name, shards=len(self.urls)) as attributes:
+            futures = [self.pool.submit(self.request, url, payload) for url in self.urls]
+            done, _ = wait(futures, timeout=self.timeout)
+            answers = []
+            for url, future in zip(self.urls, futures):
+                if future not in done:
+                    logging.warning(f"{self.name} shard {url} did not answer within {self.timeout}s, returning partial results")
+                    continue
+                try:
+                    answers.append(future.result())
+                except Exception as e:
+                    logging.warning(f"{self.name} shard {url} failed ({e}), returning partial results")
+            attributes["answered"] = len(answers)
+        if not answers:
+            raise RuntimeError(f"None of the {len(self.urls)} {self.name} retrieval services answered")
+        return [self.merge([answer[row] for answer in answers], k) for row in range(len(queries))]
+
+    def request(self, url, payload):
+        response = requests.post(f"{url}/search", json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()["results"]
+
+    @staticmethod
+    def merge(contexts, k):
+        context = sorted((c for shard in contexts for c in shard), key=lambda c: c["distance"], reverse=True)[:k]
+        if not context:
+            return context
+        return GraphRAG.score(context, GraphRAG.max_distance(context))
@@ -0,0 +1,125 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from LexicalIndex import tokenize
+
+class RetrievalCache:
+    """
+    Reranked retrieval results of one corpus, keyed by query embedding.
+
+    Embeddings are bucketed with random-hyperplane LSH (RETRIEVAL_CACHE_TABLES
+    tables of RETRIEVAL_CACHE_BITS bits), so near-duplicate queries land in a
+    shared bucket. A candidate found there is only returned when its cosine
+    similarity to the query is at least RETRIEVAL_CACHE_SIMILARITY, so a bucket
+    collision never returns another question's context. Keys also hold k,
+    the filters, the query's identifier terms and the corpus snapshot
+    version. Identifier terms are the tokens containing a digit (bill numbers,
+    citations, years): "H.R. 1234" and "H.R. 1235" embed almost identically
+    but BM25 and GraphRAG retrieve different chunks for them. Entries expire after
+    RETRIEVAL_CACHE_TTL seconds, and all of them are dropped once a newer
+    version is seen after ingestion or a merge.
+    """
+
+    def __init__(self, max_entries=None, ttl=None, similarity=None, tables=None, bits=None):
+        self.max_entries = int(max_entries or os.getenv("RETRIEVAL_CACHE_SIZE", 1000))
+        self.ttl = float(ttl or os.getenv("RETRIEVAL_CACHE_TTL", 600))
+        self.similarity = float(similarity or os.getenv("RETRIEVAL_CACHE_SIMILARITY", 0.98))
+        self.tables = int(tables or os.getenv("RETRIEVAL_CACHE_TABLES", 4))
+        self.bits = int(bits or os.getenv("RETRIEVAL_CACHE_BITS", 12))
+        self.planes = None
+        self.version = None
+        self.entries = OrderedDict()
+        self.buckets = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize(embedding):
+        embedding = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        return embedding / (np.linalg.norm(embedding) + 1e-12)
+
+    def hashes(self, embedding):
+        if self.planes is None or self.planes.shape[1] != len(embedding):
+            # Fixed seed so the buckets only depend on the embedding
+            self.planes = np.random.default_rng(0).standard_normal((self.tables * self.bits, len(embedding))).astype(np.float32)
+        signs = (self.planes @ embedding > 0).reshape(self.tables, self.bits)
+        weights = 1 << np.arange(self.bits)
+        return [(table, int(row @ weights)) for table, row in enumerate(signs)]
+
+    @staticmethod
+    def scope(k, filters, query):
+        identifiers = tuple(sorted({t for t in tokenize(query) if any(c.isdigit() for c in t)}))
+        return (k, tuple(sorted((filters or {}).items())), identifiers)
+
+    def get(self, version, k, filters, query, embedding):
+        """Cached context for a near-identical query with the same identifiers, or None."""
+        embedding = self.normalize(embedding)
+        scope = self.scope(k, filters, query)
+        now = time.monotonic()
+        with self.lock:
+            self.advance(version)
+            best, best_similarity = None, self.similarity
+            expired = set()
+            for bucket in self.hashes(embedding):
+                for entry_id in self.buckets.get((scope, bucket), ()):
+                    entry = self.entries[entry_id]
+                    if entry["expires"] <= now:
+                        expired.add(entry_id)
+                        continue
+                    similarity = float(np.dot(entry["embedding"], embedding))
+                    if similarity >= best_similarity:
+                        best, best_similarity = entry_id, similarity
+            for entry_id in expired:
+                self.evict(entry_id)
+            if best is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(best)
+            self.hits += 1
+            return [dict(c) for c in self.entries[best]["context"]]
+
+    def put(self, version, k, filters, query, embedding, context):
+        embedding = self.normalize(embedding)
+        scope = self.scope(k, filters, query)
+        buckets = [(scope, bucket) for bucket in self.hashes(embedding)]
+        with self.lock:
+            self.advance(version)
+            if version != self.version:
+                # Results from an older snapshot than the one already cached
+                return
+            entry_id = object()
+            self.entries[entry_id] = {
+                "embedding": embedding,
+                "context": [dict(c) for c in context],
+                "buckets": buckets,
+                "expires": time.monotonic() + self.ttl,
+            }
+            for bucket in buckets:
+                self.buckets.setdefault(bucket, []).append(entry_id)
+            while len(self.entries) > self.max_entries:
+                self.evict(next(iter(self.entries)))
+
+    def advance(self, version):
+        """Drop everything cached for older snapshots once `version` is newer."""
+        if self.version is None or version > self.version:
+            self.version = version
+            self.entries.clear()
+            self.buckets.clear()
+
+    def evict(self, entry_id):
+        entry = self.entries.pop(entry_id)
+        for bucket in entry["buckets"]:
+            ids = self.buckets.get(bucket)
+            if ids is None:
+                continue
+            ids.remove(entry_id)
+            if not ids:
+                del self.buckets[bucket]
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,113 @@
+"""
+Serve one corpus, or one shard of it, to MCPServer over localhost HTTP.
+
+Each service loads its domain client (FAISS, BM25, knowledge graph and GLiNER)
+and answers POST /search with GraphRAG-tagged hits; MCPServer scatters
+searches across the services listed in RETRIEVAL_SERVICES and merges them.
+
+Usage (from the repository root):
+    python src/RetrievalService.py --domain bills --port 8101
+    python src/RetrievalService.py --domain opinions --shard 0 --shards 2 --port 8103
+    python src/RetrievalService.py --domain opinions --shard 1 --shards 2 --port 8104
+    RETRIEVAL_SERVICES="bills=http://127.0.0.1:8101;opinions=http://127.0.0.1:8103,http://127.0.0.1:8104" python src/MCPServer.py
+"""
+import os
+os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
+
+import sys
+import json
+import logging
+import argparse
+import numpy as np
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from dotenv import load_dotenv
+
+from BillClient import BillClient
+from OrderClient import OrderClient
+from OpinionClient import OpinionClient
+
+logging.basicConfig(level=logging.INFO, stream=sys.stderr, format='%(asctime)s - %(levelname)s - %(message)s')
+
+CLIENTS = {"bills": BillClient, "orders": OrderClient, "opinions": OpinionClient}
+
+def to_json(obj):
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"{type(obj).__name__} is not JSON serializable")
+
+
+def make_handler(client, shard, shards):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            if self.path != "/health":
+                self.send_error(404)
+                return
+            snapshot = client.snapshot
+            self.reply(200, {
+                "domain": client.name,
+                "shard": shard,
+                "shards": shards,
+                "chunks": snapshot.count,
+                "vectors": snapshot.index.ntotal,
+                "version": snapshot.version,
+            })
+
+        def do_POST(self):
+            if self.path != "/search":
+                self.send_error(404)
+                return
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                embeddings = np.ascontiguousarray(body["embeddings"], dtype=np.float32)
+                results = client.batch_tag(body["queries"], embeddings, int(body.get("k", 5)), body.get("filters") or None)
+            except Exception as e:
+                logging.error(f"ERROR: {client.name} search failed: {e}")
+                self.reply(500, {"error": str(e)})
+                return
+            self.reply(200, {"results": results})
+
+        def reply(self, status, data):
+            payload = json.dumps(data, default=to_json).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Serve one domain's retrieval, or a shard of it, over HTTP.")
+    parser.add_argument("--domain", choices=sorted(CLIENTS), required=True)
+    parser.add_argument("--shard", type=int, default=0, help="This shard's number, from 0")
+    parser.add_argument("--shards", type=int, default=1, help="Number of shards the index is split into")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8101)
+    parser.add_argument("--dim", type=int, default=int(os.getenv("EMBEDDING_DIM", 0)) or None, help="Matryoshka dimension; must match the MCP server's EMBEDDING_DIM")
+    args = parser.parse_args()
+    if not 0 <= args.shard < args.shards:
+        parser.error("--shard must be between 0 and --shards - 1")
+
+    client = CLIENTS[args.domain](dim=args.dim)
+    if args.shards > 1:
+        client.shard(args.shard, args.shards)
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(client, args.shard, args.shards))
+    logging.info(f"Serving {args.domain} shard {args.shard + 1}/{args.shards} on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import os
+import threading
+import numpy as np
+from Cancellation import Cancelled
+
+class Call:
+    def __init__(self, key, group):
+        self.key = key
+        self.group = group
+        self.embedding = None
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical requests.
+
+    The first caller for a key becomes the leader and does the work; callers
+    that arrive while it is in flight wait for its result instead. A leader can
+    also publish its query embedding, so later calls in the same parameter
+    group whose embedding is within COALESCE_SIMILARITY (cosine) can follow it.
+    Followers stop waiting after COALESCE_TIMEOUT seconds and do the work
+    themselves.
+    """
+
+    def __init__(self, timeout=None, similarity=None):
+        self.timeout = float(timeout or os.getenv("COALESCE_TIMEOUT", 30))
+        self.similarity = float(similarity or os.getenv("COALESCE_SIMILARITY", 0.97))
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    def join(self, key, group=None):
+        """Returns (call, leader); the leader must `finish` the call."""
+        with self.lock:
+            call = self.calls.get(key)
+            if call is not None:
+                return call, False
+            call = Call(key, group)
+            self.calls[key] = call
+            return call, True
+
+    def match(self, call, embedding):
+        """
+        Publish `call`'s embedding and return an earlier in-flight call in the
+        same group with a near-identical one, if any.
+
+        Calls only ever match calls that published before them, so two leaders
+        can never end up waiting on each other.
+        """
+        embedding = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        embedding = embedding / (np.linalg.norm(embedding) + 1e-12)
+        with self.lock:
+            best, best_similarity = None, self.similarity
+            for other in self.calls.values():
+                if other is call or other.embedding is None or other.group != call.group:
+                    continue
+                similarity = float(np.dot(other.embedding, embedding))
+                if similarity >= best_similarity:
+                    best, best_similarity = other, similarity
+            call.embedding = embedding
+            return best
+
+    def finish(self, call, result=None, error=None):
+        with self.lock:
+            if self.calls.get(call.key) is call:
+                del self.calls[call.key]
+        call.result = result
+        call.error = error
+        call.done.set()
+
+    def wait(self, call):
+        """
+        The leader's result (re-raising its error), or None if it took longer
+        than the timeout or its own client cancelled it.
+        """
+        if not call.done.wait(self.timeout):
+            return None
+        if isinstance(call.error, Cancelled):
+            return None
+        if call.error is not None:
+            raise call.error
+        return call.result
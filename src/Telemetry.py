@@ -0,0 +1,180 @@
+import contextvars
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    from prometheus_client import Counter, Gauge, Histogram, generate_latest, start_http_server
+except ImportError:
+    Counter = Gauge = Histogram = generate_latest = start_http_server = None
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:
+    otel_trace = None
+
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+if Histogram is not None:
+    STAGE_SECONDS = Histogram("legalai_stage_seconds", "Duration of pipeline stages", ["stage"], buckets=STAGE_BUCKETS)
+    STAGE_ERRORS = Counter("legalai_stage_errors_total", "Pipeline stages that raised", ["stage"])
+    LLM_TOKENS = Counter("legalai_llm_tokens_total", "Tokens reported by the LLM API", ["model", "kind"])
+    LLM_SITE_SECONDS = Histogram("legalai_llm_site_seconds", "LLM latency per call site, including escalation", ["site", "model"], buckets=STAGE_BUCKETS)
+    LLM_ESCALATIONS = Counter("legalai_llm_escalations_total", "Small model replies that failed to parse and were retried on the large model", ["site"])
+    LLM_SHED = Counter("legalai_llm_shed_total", "Optional LLM requests dropped after queueing too long", ["site"])
+    BATCH_SIZE = Histogram("legalai_batch_size", "Inputs per batched model call", ["model"], buckets=BATCH_BUCKETS)
+    BATCH_QUEUE_DEPTH = Gauge("legalai_batch_queue_depth", "Requests still waiting after a batch was formed", ["model"])
+else:
+    STAGE_SECONDS = STAGE_ERRORS = LLM_TOKENS = LLM_SITE_SECONDS = LLM_ESCALATIONS = LLM_SHED = None
+    BATCH_SIZE = BATCH_QUEUE_DEPTH = None
+
+_tracer = otel_trace.get_tracer("legalai") if otel_trace is not None else None
+_current_trace = contextvars.ContextVar("legalai_trace", default=None)
+_listeners = []
+
+
+class Trace:
+    """Spans recorded while handling a single request."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.spans = []
+        self.lock = threading.Lock()
+
+    def add(self, name, start, seconds, attributes):
+        with self.lock:
+            self.spans.append({
+                "stage": name,
+                "start_ms": round((start - self.start) * 1000, 2),
+                "ms": round(seconds * 1000, 2),
+                **attributes,
+            })
+
+    def summary(self):
+        """Totals per stage plus the raw spans, for the `thinking` field in debug mode."""
+        with self.lock:
+            spans = sorted(self.spans, key=lambda s: s["start_ms"])
+        stages = {}
+        for s in spans:
+            total = stages.setdefault(s["stage"], {"count": 0, "ms": 0.0})
+            total["count"] += 1
+            total["ms"] = round(total["ms"] + s["ms"], 2)
+        return {
+            "total_ms": round((time.perf_counter() - self.start) * 1000, 2),
+            "prompt_tokens": sum(s.get("prompt_tokens", 0) for s in spans),
+            "completion_tokens": sum(s.get("completion_tokens", 0) for s in spans),
+            "stages": stages,
+            "spans": spans,
+        }
+
+
+def start_trace():
+    """Begin collecting spans for the current request and return the Trace."""
+    trace = Trace()
+    _current_trace.set(trace)
+    return trace
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+def add_listener(listener):
+    """Register `listener(stage, seconds, attributes)`, called whenever a span ends."""
+    _listeners.append(listener)
+
+
+@contextmanager
+def span(name, **attributes):
+    """
+    Time a pipeline stage.
+
+    The duration is recorded in the `legalai_stage_seconds` histogram, added to
+    the active request trace and, when OpenTelemetry is installed, exported as a
+    span. Attributes set on the yielded dict are attached to all three.
+    """
+    start = time.perf_counter()
+    otel_cm = _tracer.start_as_current_span(name) if _tracer is not None else None
+    otel_span = otel_cm.__enter__() if otel_cm is not None else None
+    failed = False
+    exc_info = (None, None, None)
+    try:
+        yield attributes
+    except BaseException:
+        failed = True
+        exc_info = sys.exc_info()
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        if STAGE_SECONDS is not None:
+            STAGE_SECONDS.labels(stage=name).observe(seconds)
+            if failed:
+                STAGE_ERRORS.labels(stage=name).inc()
+        if otel_span is not None:
+            for key, value in attributes.items():
+                if isinstance(value, (str, bool, int, float)):
+                    otel_span.set_attribute(f"legalai.{key}", value)
+            # Exception info lets OpenTelemetry record it and mark the span as an error
+            otel_cm.__exit__(*exc_info)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(name, start, seconds, attributes)
+        for listener in _listeners:
+            listener(name, seconds, attributes)
+
+
+def record_llm_usage(attributes, model, usage):
+    """Copy token counts from a Groq `usage` block onto a span and the token counters."""
+    if not usage:
+        return
+    prompt_tokens = usage.get("prompt_tokens", 0)
+    completion_tokens = usage.get("completion_tokens", 0)
+    attributes["prompt_tokens"] = prompt_tokens
+    attributes["completion_tokens"] = completion_tokens
+    if LLM_TOKENS is not None:
+        LLM_TOKENS.labels(model=model, kind="prompt").inc(prompt_tokens)
+        LLM_TOKENS.labels(model=model, kind="completion").inc(completion_tokens)
+
+
+def record_llm_call(site, model, seconds, escalated):
+    """Per call site latency, labelled with the model that produced the final reply."""
+    if LLM_SITE_SECONDS is None:
+        return
+    LLM_SITE_SECONDS.labels(site=site, model=model).observe(seconds)
+    if escalated:
+        LLM_ESCALATIONS.labels(site=site).inc()
+
+
+def record_llm_shed(site):
+    if LLM_SHED is not None:
+        LLM_SHED.labels(site=site or "unknown").inc()
+
+
+def record_batch(model, size, queue_depth):
+    if BATCH_SIZE is not None:
+        BATCH_SIZE.labels(model=model).observe(size)
+        BATCH_QUEUE_DEPTH.labels(model=model).set(queue_depth)
+
+
+def export_metrics():
+    """Prometheus text exposition of all metrics, or an empty string without prometheus_client."""
+    if generate_latest is None:
+        return ""
+    return generate_latest().decode("utf-8")
+
+
+def start_metrics_server():
+    """Serve /metrics on METRICS_PORT when it is set."""
+    port = os.getenv("METRICS_PORT")
+    if not port or start_http_server is None:
+        return
+    start_http_server(int(port), addr=os.getenv("METRICS_ADDR", "127.0.0.1"))
+    logging.info(f"Serving Prometheus metrics on port {port}")
+
+
+def debug_enabled(debug=False):
+    return debug or os.getenv("LEGALAI_DEBUG", "").lower() in ("1", "true", "yes")
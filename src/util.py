@@ -1,4 +1,29 @@
 import numpy as np
 
 def cosine_similarity(vec1: np.ndarray, vec2: np.ndarray) -> float:
-    return 1-(np.dot(vec1, vec2) / (np.linalg.norm(vec1) * np.linalg.norm(vec2)))
\ No newline at end of file
+    return 1-(np.dot(vec1, vec2) / (np.linalg.norm(vec1) * np.linalg.norm(vec2)))
+
+def matryoshka(embeddings, dim: int) -> np.ndarray:
+    """
+    Reduce nomic-embed-text-v1.5 embeddings to `dim` dimensions.
+
+    Follows the model card: layer norm over the full vector, keep the first
+    `dim` components, then L2-normalize. Layer norm is scale invariant, so this
+    also works on embeddings that were already normalized at full size.
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    single = embeddings.ndim == 1
+    embeddings = embeddings.reshape(1, -1) if single else embeddings
+    mean = embeddings.mean(axis=1, keepdims=True)
+    var = embeddings.var(axis=1, keepdims=True)
+    embeddings = ((embeddings - mean) / np.sqrt(var + 1e-5))[:, :dim]
+    embeddings = np.ascontiguousarray(embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True), dtype=np.float32)
+    return embeddings[0] if single else embeddings
+
+
+def chunk_text(chunk: dict) -> str:
+    """Body text of a bill/order (`chunk_text.text`), opinion (`text`) or news (`body`) chunk."""
+    text = chunk.get("chunk_text")
+    if text is not None:
+        return text.get("text", "") if isinstance(text, dict) else str(text)
+    return chunk.get("text") or chunk.get("body") or ""
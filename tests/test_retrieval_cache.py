@@ -0,0 +1,35 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from RetrievalCache import RetrievalCache
+
+
+def near_duplicates(dim=64, cosine=0.995):
+    rng = np.random.default_rng(1)
+    a = rng.standard_normal(dim).astype(np.float32)
+    a /= np.linalg.norm(a)
+    noise = rng.standard_normal(dim).astype(np.float32)
+    noise -= noise.dot(a) * a
+    noise /= np.linalg.norm(noise)
+    b = cosine * a + np.sqrt(1 - cosine ** 2) * noise
+    return a, b
+
+
+def test_near_duplicate_query_hits():
+    cache = RetrievalCache(similarity=0.98)
+    a, b = near_duplicates()
+    cache.put(1, 5, None, "What does H.R. 1234 do?", a, [{"chunk": {"number": "1234"}}])
+    assert cache.get(1, 5, None, "what does h.r. 1234 do", b) == [{"chunk": {"number": "1234"}}]
+
+
+def test_identifier_only_variants_do_not_share_an_entry():
+    cache = RetrievalCache(similarity=0.98)
+    a, b = near_duplicates()
+    cache.put(1, 5, None, "What does H.R. 1234 do?", a, [{"chunk": {"number": "1234"}}])
+    assert cache.get(1, 5, None, "What does H.R. 1235 do?", b) is None
+    assert cache.get(1, 5, None, "What does H.R. 1235 do?", a) is None
+    assert cache.get(1, 5, None, "What does 42 U.S.C. 1983 say?", a) is None